@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import time
+import numpy as np
+import soundfile as sf
+import cache
+
+# --- ACOUSTIC FINGERPRINT INDEX ---
+# Playlists often hold one song several times (lyric video, official audio, re-uploads) under
+# different IDs. Pairs of spectral peaks hashed with their time gap identify the recording no
+# matter the source, so a duplicate reuses the earlier stem and lyrics (shifted by the measured
+# offset) instead of another separation pass. The same index hands out output titles, so two
+# different songs with one name no longer overwrite each other's files.
+INDEX_DB = os.environ.get("KARAOKE_FINGERPRINTS", os.path.expanduser("~/.cache/karaoke_cloud_fingerprints.sqlite"))
+TARGET_RATE = 11025      # audio is box-filtered down to about this rate before analysis
+WINDOW_SECONDS = 0.2     # 5 Hz bins; with the hop, whole samples at 44.1k, 48k and their divisions
+HOP_SECONDS = 0.04
+MAX_HZ = 3000
+PEAK_BINS, PEAK_FRAMES = 15, 5   # a peak is the maximum of its +/-75 Hz, +/-0.2 s neighbourhood
+PEAK_PERCENTILE = 80     # and louder than most of the spectrogram
+FAN_OUT = 4              # each peak is paired with the next few peaks
+MAX_DELTA = 63           # frames (~2.5 s) between paired peaks; fits the 6-bit field
+MIN_MATCHES = 50
+MIN_RATIO = 0.1          # share of the track's hashes that line up at the best offset
+MIN_COVERAGE = 0.85      # the reused stem must cover this much of both recordings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_id TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    duration REAL NOT NULL,
+    lrc TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    hash INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    t INTEGER NOT NULL,
+    PRIMARY KEY (hash, track_id, t)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS titles (
+    title TEXT PRIMARY KEY,
+    owner TEXT NOT NULL
+);
+"""
+
+def connect():
+    os.makedirs(os.path.dirname(INDEX_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(INDEX_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+# --- FINGERPRINTS ---
+ANALYSIS_SECONDS = 300   # spectrogram rows held at once; long DJ sets are fingerprinted in slices
+READ_BLOCK = 1 << 16     # decimated samples decoded per read
+
+def _mono_blocks(path):
+    """Returns (rate, generator of mono float32 blocks) with the file box-filtered down to about TARGET_RATE."""
+    native = sf.info(path).samplerate
+    q = max(1, int(native // TARGET_RATE))
+    def blocks():
+        for block in sf.blocks(path, blocksize=q * READ_BLOCK, dtype='float32', always_2d=True):
+            mono = block.mean(axis=1)
+            yield mono[:len(mono) // q * q].reshape(-1, q).mean(axis=1)  # only the last block is ragged
+    return native / q, blocks()
+
+def _window_max(values, radius, axis):
+    padded = np.pad(values, [(radius, radius) if a == axis else (0, 0) for a in range(values.ndim)], mode='edge')
+    return np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1, axis=axis).max(axis=-1)
+
+def _spectrogram_slices(blocks, win, hop, bins, rows):
+    """Yields log-magnitude spectrogram slices of about rows frames; the input is never held whole."""
+    window = np.hanning(win).astype(np.float32)
+    buf = np.zeros(0, dtype=np.float32)
+    def frames(upto):
+        view = np.lib.stride_tricks.sliding_window_view(buf, win)[::hop][:upto]
+        # A few hundred frames per FFT keeps the complex intermediate small
+        return [np.log(np.abs(np.fft.rfft(view[i:i + 512] * window, axis=1)[:, 1:bins + 1]) + 1e-6).astype(np.float32) for i in range(0, len(view), 512)]
+    for block in blocks:
+        buf = np.concatenate([buf, block])
+        n = (len(buf) - win) // hop + 1 if len(buf) >= win else 0
+        if n >= rows:
+            spec = np.concatenate(frames(n))
+            buf = buf[n * hop:]
+            yield spec
+    n = (len(buf) - win) // hop + 1 if len(buf) >= win else 0
+    if n: yield np.concatenate(frames(n))
+
+def fingerprint(path):
+    """Returns {'hashes': int64 array of (hash, frame) rows, 'duration': seconds} for an audio file, in bounded memory."""
+    rate, blocks = _mono_blocks(path)
+    win, hop = int(round(rate * WINDOW_SECONDS)), int(round(rate * HOP_SECONDS))
+    bins = min(int(MAX_HZ * WINDOW_SECONDS), win // 2)
+    samples, peaks = 0, []
+    def counted():
+        nonlocal samples
+        for block in blocks:
+            samples += len(block)
+            yield block
+    # Each slice is analysed with PEAK_FRAMES rows of context on both sides carried over from its
+    # neighbours, so the maximum filter sees exactly what it would on the whole spectrogram
+    carry, first = None, 0  # carry holds the last 2 * PEAK_FRAMES rows, starting at global frame first
+    slices = _spectrogram_slices(counted(), win, hop, bins, int(ANALYSIS_SECONDS / HOP_SECONDS))
+    current = next(slices, None)
+    while current is not None:
+        following = next(slices, None)
+        spec = current if carry is None else np.concatenate([carry, current])
+        lo = 0 if carry is None else PEAK_FRAMES
+        hi = len(spec) if following is None else len(spec) - PEAK_FRAMES
+        local = _window_max(_window_max(spec, PEAK_BINS, 1), PEAK_FRAMES, 0)
+        t, f = np.nonzero((spec[lo:hi] == local[lo:hi]) & (spec[lo:hi] > np.percentile(spec, PEAK_PERCENTILE)))
+        peaks.append(np.stack([t + lo + first, f], axis=1))
+        carry = spec[-2 * PEAK_FRAMES:]
+        first += len(spec) - len(carry)
+        current = following
+    duration = samples / rate
+    if not peaks: return {'hashes': np.zeros((0, 2), dtype=np.int64), 'duration': duration}
+    t, f = np.concatenate(peaks).T  # sorted by time
+    rows = []
+    for k in range(1, FAN_OUT + 1):
+        dt = t[k:] - t[:-k]
+        ok = (dt > 0) & (dt <= MAX_DELTA)
+        rows.append(np.stack([(f[:-k][ok] << 16) | (f[k:][ok] << 6) | dt[ok], t[:-k][ok]], axis=1))
+    hashes = np.unique(np.concatenate(rows).astype(np.int64), axis=0)
+    return {'hashes': hashes, 'duration': duration}
+
+def identify(fp, exclude=None):
+    """Finds an indexed recording of the same audio; returns its row plus 'offset' (its time minus ours) or None."""
+    hashes = fp['hashes']
+    if len(hashes) < MIN_MATCHES: return None
+    conn = connect()
+    try:
+        conn.execute("CREATE TEMP TABLE probe (hash INTEGER, t INTEGER)")
+        conn.executemany("INSERT INTO probe VALUES (?, ?)", hashes.tolist())
+        rows = conn.execute("""SELECT h.track_id, h.t - p.t AS delta, COUNT(*) AS n FROM probe p JOIN hashes h ON h.hash = p.hash
+                               WHERE h.track_id NOT IN (SELECT id FROM tracks WHERE source_id = ?)
+                               GROUP BY h.track_id, delta HAVING n >= 3""", (exclude,)).fetchall()
+        votes = {(r['track_id'], r['delta']): r['n'] for r in rows}
+        # Frames of two encodes rarely line up exactly, so neighbouring offsets vote together
+        best = max(((sum(votes.get((tid, d + k), 0) for k in (-1, 0, 1)), tid, d) for tid, d in votes), default=None)
+        if not best or best[0] < MIN_MATCHES or best[0] < MIN_RATIO * len(hashes): return None
+        score, track_id, delta = best
+        match = dict(conn.execute("SELECT * FROM tracks WHERE id = ?", (track_id,)).fetchone())
+    finally:
+        conn.close()
+    offset = delta * HOP_SECONDS
+    overlap = min(fp['duration'], match['duration'] - offset) - max(0.0, -offset)
+    if overlap < MIN_COVERAGE * max(fp['duration'], match['duration']): return None
+    match.update(offset=offset, matches=score, ratio=score / len(hashes))
+    return match
+
+def register(source_id, title, fp, lrc=None):
+    """Adds (or replaces) a separated recording so later duplicates can reuse its stem."""
+    if not source_id or not len(fp['hashes']): return
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        old = conn.execute("SELECT id FROM tracks WHERE source_id = ?", (source_id,)).fetchone()
+        if old: conn.execute("DELETE FROM hashes WHERE track_id = ?", (old['id'],))
+        conn.execute("DELETE FROM tracks WHERE source_id = ?", (source_id,))
+        cur = conn.execute("INSERT INTO tracks (source_id, title, duration, lrc, created_at) VALUES (?, ?, ?, ?, ?)", (source_id, title, fp['duration'], lrc, time.time()))
+        conn.executemany("INSERT OR IGNORE INTO hashes (hash, track_id, t) VALUES (?, ?, ?)", ((h, cur.lastrowid, t) for h, t in fp['hashes'].tolist()))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+def set_lyrics(source_id, lrc):
+    conn = connect()
+    try: conn.execute("UPDATE tracks SET lrc = ? WHERE source_id = ?", (lrc, source_id))
+    finally: conn.close()
+
+# --- REUSE ---
+def _write_silence(out, frames, channels):
+    while frames > 0:
+        n = min(frames, READ_BLOCK)
+        out.write(np.zeros((n, channels), dtype=np.float32))
+        frames -= n
+
+def align(src, dest, offset, duration):
+    """Writes src shifted so dest at t plays src at t + offset, trimmed or silence-padded to duration (streamed)."""
+    info = sf.info(src)
+    start, length = int(round(offset * info.samplerate)), int(round(duration * info.samplerate))
+    with sf.SoundFile(dest, 'w', samplerate=info.samplerate, channels=info.channels) as out:
+        lead = min(length, max(0, -start))
+        _write_silence(out, lead, info.channels)
+        written, begin = lead, max(0, start)
+        stop = min(info.frames, begin + length - written)
+        if stop > begin:
+            for block in sf.blocks(src, blocksize=READ_BLOCK, start=begin, stop=stop, dtype='float32', always_2d=True):
+                out.write(block)
+                written += len(block)
+        _write_silence(out, length - written, info.channels)
+    return dest
+
+def reuse_stem(match, dest, duration, stems_id):
+    """Materializes the matched recording's cached stem at dest, aligned to this track; False if it was evicted."""
+    key = cache.cache_key("inst", match['source_id'], stems_id)
+    part = f"{dest}.match.wav"
+    if not cache.fetch(key, part): return False
+    try:
+        if abs(match['offset']) < HOP_SECONDS and abs(match['duration'] - duration) < HOP_SECONDS: os.replace(part, dest)
+        else: align(part, dest, match['offset'], duration)
+    finally:
+        if os.path.exists(part): os.remove(part)
+    return True
+
+# --- OUTPUT TITLES ---
+def claim_title(title, owner):
+    """Returns title, or 'title (2)', ... when another source already publishes under that name."""
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for n in range(1, 1000):
+            candidate = title if n == 1 else f"{title} ({n})"
+            row = conn.execute("SELECT owner FROM titles WHERE title = ?", (candidate,)).fetchone()
+            if row is None: conn.execute("INSERT INTO titles (title, owner) VALUES (?, ?)", (candidate, owner))
+            if row is None or row['owner'] == owner: break
+        conn.execute("COMMIT")
+        return candidate
+    finally:
+        conn.close()
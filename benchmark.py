@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+# --- BENCHMARK HARNESS ---
+# Times each stage and the end-to-end CLI pipeline on synthetic inputs (sine sweeps, noise,
+# generated LRC) with yt-dlp and syncedlyrics replaced by local fakes, so runs are repeatable
+# offline and comparable between commits:
+#   python benchmark.py --out bench.json                       # record a baseline
+#   python benchmark.py --compare bench.json --tolerance 0.15  # fail on >15% slowdowns
+SAMPLE_RATE = 44100
+AUDIO_SECONDS = [30, 240]
+LRC_LINES = [50, 500, 5000]
+KEYS = [0, 4, -4]
+
+# --- SYNTHETIC INPUTS ---
+def make_audio(path, seconds, kind="sweep"):
+    import numpy as np
+    import soundfile as sf
+    t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float64) / SAMPLE_RATE
+    if kind == "sweep":
+        # Log sweep 80 Hz -> 8 kHz, repeated every 10 s, plus a little noise
+        phase = 2 * np.pi * 80 * 10 / np.log(100) * (np.power(100, (t % 10) / 10) - 1)
+        mono = 0.4 * np.sin(phase) + 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    else:
+        mono = 0.3 * np.random.default_rng(1).standard_normal(len(t))
+    sf.write(path, np.stack([mono, mono[::-1]], axis=1).astype(np.float32), SAMPLE_RATE, subtype="PCM_16")
+    return path
+
+def make_lrc(lines, seconds=None, enhanced=False):
+    seconds = seconds or lines * 3.0
+    step = seconds / max(lines, 1)
+    out = ["[ar:Benchmark]", "[ti:Synthetic]"]
+    for i in range(lines):
+        start = i * step
+        stamp = f"[{int(start // 60):02}:{start % 60:05.2f}]"
+        words = [f"word{i}_{w}" for w in range(6)]
+        if enhanced:
+            text = " ".join(f"<{int((start + w * step / 6) // 60):02}:{(start + w * step / 6) % 60:05.2f}> {word}" for w, word in enumerate(words))
+        else:
+            text = " ".join(words)
+        out.append(f"{stamp}{text}")
+    return "\n".join(out) + "\n"
+
+# --- LOCAL FAKES ---
+def install_fakes(audio_by_id, lrc_by_title, fake_separator=False):
+    """Registers stand-in yt_dlp / syncedlyrics (and optionally audio_separator) modules before the app imports them."""
+    class FakeYoutubeDL:
+        def __init__(self, opts=None):
+            self.params = dict(opts or {})
+            self.params['outtmpl'] = {'default': self.params.get('outtmpl', "%(id)s.%(ext)s")}
+        def __enter__(self): return self
+        def __exit__(self, *exc): return False
+        def close(self): pass
+        def extract_info(self, url, download=True):
+            kind, _, ident = url.partition("://")[2].partition("/")
+            if kind == "playlist":
+                entries = [{'_type': "url", 'ie_key': "Bench", 'id': i, 'title': f"Bench Track {i}", 'url': f"bench://track/{i}"} for i in sorted(audio_by_id)]
+                return {'id': "playlist", 'title': "Bench Playlist", 'entries': entries}
+            info = {'id': ident, 'extractor_key': "Bench", 'title': f"Bench Track {ident}", 'url': url}
+            return self.process_ie_result(info, download=True) if download else info
+        def process_ie_result(self, info, download=True):
+            if info.get('_type') == "url": return self.extract_info(info['url'], download)
+            if download:
+                dest = self.params['outtmpl']['default'].replace("%(ext)s", "wav")
+                shutil.copyfile(audio_by_id[info['id']], dest)
+            return info
+
+    def search(query, enhanced=False, providers=None, **kwargs):
+        return lrc_by_title.get(query)
+
+    yt_dlp = types.ModuleType("yt_dlp")
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+    yt_dlp.utils = types.SimpleNamespace(parse_bytes=lambda s: int(float(s.rstrip("kKmM")) * {'k': 1024, 'm': 1024 ** 2}.get(s[-1].lower(), 1)))
+    sys.modules['yt_dlp'] = yt_dlp
+    sys.modules['yt_dlp.utils'] = yt_dlp.utils
+    sys.modules['syncedlyrics'] = types.SimpleNamespace(search=search)
+    if fake_separator:
+        class FakeSeparator:
+            """Copies the input as the 'instrumental' so the harness measures everything but the model."""
+            def __init__(self, output_format="WAV", **kwargs): self.output_dir, self.model_instance = None, None
+            def load_model(self, model_filename=None): time.sleep(0.01)
+            def separate(self, audio_path):
+                stem = os.path.join(self.output_dir, os.path.splitext(os.path.basename(audio_path))[0] + "_(Instrumental).wav")
+                shutil.copyfile(audio_path, stem)
+                return [stem]
+        package = types.ModuleType("audio_separator")
+        package.separator = types.SimpleNamespace(Separator=FakeSeparator)
+        sys.modules['audio_separator'] = package
+        sys.modules['audio_separator.separator'] = package.separator
+
+# --- TIMING ---
+def timed(func, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {'median': statistics.median(runs), 'min': min(runs), 'runs': [round(r, 4) for r in runs]}
+
+def environment():
+    def version(cmd):
+        try: return subprocess.run(cmd, capture_output=True, text=True).stdout.splitlines()[0]
+        except (OSError, IndexError): return None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'ffmpeg': version(["ffmpeg", "-version"]), 'git': version(["git", "rev-parse", "--short", "HEAD"]),
+            'date': datetime.now().isoformat(timespec="seconds")}
+
+def run_benchmarks(work, repeat, seconds_list, lrc_lines, tracks, fake_separator, only=None):
+    results, skipped = {}, {}
+    want = lambda name: not only or any(name.startswith(o) for o in only)
+    audio = {s: make_audio(os.path.join(work, f"sweep_{s}s.wav"), s) for s in seconds_list}
+    noise = make_audio(os.path.join(work, "noise_30s.wav"), 30, kind="noise")
+    lrc_files = {}
+    for n in lrc_lines:
+        lrc_files[n] = os.path.join(work, f"lyrics_{n}.lrc")
+        with open(lrc_files[n], "w", encoding="utf-8") as f: f.write(make_lrc(n, enhanced=n == lrc_lines[0]))
+
+    # Fakes must be registered before the app modules import yt_dlp / syncedlyrics / audio_separator
+    track_ids = [str(i) for i in range(tracks)]
+    install_fakes({i: (audio[seconds_list[0]] if int(i) % 2 == 0 else noise) for i in track_ids},
+                  {f"Bench Track {i}": make_lrc(40, seconds=seconds_list[0]) for i in track_ids}, fake_separator=fake_separator)
+    os.environ['KARAOKE_CACHE'] = os.path.join(work, "cache")
+    os.environ['KARAOKE_LYRICS_CACHE'] = os.path.join(work, "lyrics_cache")
+    os.environ['KARAOKE_CHECKPOINTS'] = os.path.join(work, "checkpoints")
+    os.environ['KARAOKE_SPANS'] = os.path.join(work, "spans.jsonl")
+    os.environ['KARAOKE_FINGERPRINTS'] = os.path.join(work, "fingerprints", "index.sqlite")
+    os.environ['KARAOKE_CATALOG'] = os.path.join(work, "catalog", "catalog.sqlite")
+    cwd = os.getcwd()
+    os.chdir(work)  # cli creates ./output on import
+    try:
+        import cli
+        import media
+        import subtitles
+        import telemetry
+    finally:
+        os.chdir(cwd)
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+
+    for n, path in lrc_files.items():
+        name = f"lrc_to_srt/{n}_lines"
+        # Parse + write; the memo is cleared so every repeat measures a cold parse
+        if want(name): results[name] = timed(lambda: (subtitles._memo.clear(), subtitles.convert(path, os.path.join(work, "out.srt"))), repeat)
+
+    srt = os.path.join(work, "out.srt")
+    def lyric_track_mux(path, seconds):
+        # Multi-key video path: one lyric render, then a stream-copy mux per key
+        lyric_track = os.path.join(work, "lyric_track.mp4")
+        media.render_lyric_track(srt, seconds, lyric_track)
+        for k in KEYS: media.mux_audio(lyric_track, [path], os.path.join(work, f"mux_{k}.mp4"))
+
+    for s, path in audio.items():
+        for name, func in [
+            (f"deliver_audio/{s}s", lambda: media.deliver_audio(path, os.path.join(work, "out.mp3"))),
+            (f"pitch_shift/{s}s_{len(KEYS) - 1}keys", lambda: media.pitch_shift(path, {k: os.path.join(work, f"p{k}.wav") for k in KEYS})),
+            (f"create_video/{s}s", lambda: media.create_video(path, srt, os.path.join(work, "out.mp4"))),
+            (f"lyric_track_mux/{s}s_{len(KEYS)}keys", lambda: lyric_track_mux(path, s)),
+        ]:
+            if not want(name): continue
+            if not has_ffmpeg:
+                skipped[name] = "ffmpeg not found"
+                continue
+            subtitles.convert(lrc_files[lrc_lines[0]], srt)
+            results[name] = timed(func, repeat)
+
+    for name in ("separate", "end_to_end"):
+        if want(name) and not has_ffmpeg: skipped[name] = "ffmpeg not found"
+
+    if want("separate") and has_ffmpeg:
+        import models
+        from separation import separate_instrumental
+        results["separate/model_load"] = {'median': models.warm(cli.MODEL_FILENAME) or 0.0}
+        for s, path in audio.items():
+            def separate():
+                ws = tempfile.mkdtemp(dir=work)
+                with models.use_separator(cli.MODEL_FILENAME) as sep: separate_instrumental(sep, path, ws)
+                shutil.rmtree(ws, ignore_errors=True)
+            results[f"separate/{s}s"] = timed(separate, repeat)
+
+    if want("end_to_end") and has_ffmpeg:
+        output = os.path.join(work, "output")
+        cli.OUTPUT_DIR, cli.VIDEO_DIR = output, os.path.join(output, "Karaoke_Videos_Final")
+        cli.LOG_FILE = os.path.join(output, "bench_report.csv")
+        cli.catalog.configure(output)
+        playlist = "bench://playlist/all"
+        def end_to_end():
+            # Cold run every time: caches and checkpoints would otherwise turn repeats into lookups
+            for d in (os.environ['KARAOKE_CACHE'], os.environ['KARAOKE_CHECKPOINTS'], output, os.environ['KARAOKE_LYRICS_CACHE'], os.path.dirname(os.environ['KARAOKE_FINGERPRINTS']), os.path.dirname(os.environ['KARAOKE_CATALOG'])):
+                shutil.rmtree(d, ignore_errors=True)
+            os.makedirs(cli.VIDEO_DIR, exist_ok=True)
+            with cli.downloads.DownloadSession(cli.DOWNLOAD_WORKERS) as session:
+                cli.process_tracks(playlist, session.list(playlist), KEYS, True, session, interactive=False, lyrics_map=None)
+        results[f"end_to_end/{tracks}tracks_{len(KEYS)}keys"] = timed(end_to_end, repeat)
+        spans = telemetry.load_spans(os.environ['KARAOKE_SPANS'])
+        for stage, row in telemetry.summarize(spans).items():
+            results[f"end_to_end_stage/{stage}"] = {'median': row['wall_seconds']['p50'], 'p95': row['wall_seconds']['p95'], 'count': row['count']}
+
+    return results, skipped
+
+def compare(results, baseline, tolerance):
+    """Prints the change against a baseline file and returns the names that got slower than the tolerance."""
+    regressions = []
+    print(f"\n{'benchmark':<40}{'baseline':>10}{'now':>10}{'change':>9}")
+    for name, now in sorted(results.items()):
+        old = baseline.get('results', {}).get(name)
+        if not old or not old.get('median'):
+            print(f"{name:<40}{'-':>10}{now['median']:>10.3f}{'new':>9}")
+            continue
+        change = now['median'] / old['median'] - 1
+        flag = " ⚠️" if change > tolerance else ""
+        if change > tolerance: regressions.append(name)
+        print(f"{name:<40}{old['median']:>10.3f}{now['median']:>10.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic inputs with local fakes.")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the results JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before a benchmark counts as a regression")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tracks", type=int, default=4, help="tracks in the end-to-end run")
+    parser.add_argument("--quick", action="store_true", help="short audio and LRC only")
+    parser.add_argument("--real-separator", action="store_true", help="use the real model instead of the pass-through stand-in")
+    parser.add_argument("--only", nargs="*", help="benchmark name prefixes to run, e.g. pitch_shift lrc_to_srt")
+    args = parser.parse_args()
+
+    seconds_list = AUDIO_SECONDS[:1] if args.quick else AUDIO_SECONDS
+    lrc_lines = LRC_LINES[:2] if args.quick else LRC_LINES
+    work = tempfile.mkdtemp(prefix="karaoke_bench_")
+    try:
+        print(f"⏱ Benchmarking in {work} ({args.repeat} repeats, {'real' if args.real_separator else 'stand-in'} separator)...")
+        results, skipped = run_benchmarks(work, args.repeat, seconds_list, lrc_lines, args.tracks, not args.real_separator, args.only)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {'environment': environment(), 'settings': {'repeat': args.repeat, 'tracks': args.tracks, 'audio_seconds': seconds_list, 'lrc_lines': lrc_lines,
+              'keys': KEYS, 'separator': "real" if args.real_separator else "stand-in"}, 'results': results, 'skipped': skipped}
+    with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+    for name, why in skipped.items(): print(f"⏭ Skipped {name}: {why}")
+    print(f"📄 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f: baseline = json.load(f)
+        if baseline.get('settings') != report['settings']: print("⚠️ Baseline was recorded with different settings; numbers may not be comparable.")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions.")
+    else:
+        for name, r in sorted(results.items()): print(f"{name:<40}{r['median']:>10.3f}s")
+
+if __name__ == "__main__": main()
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import shutil
+import threading
+
+# --- CONTENT-ADDRESSED AUDIO CACHE ---
+# Downloads, instrumental stems and pitched variants are stored under a hash of what
+# produced them (source extractor + ID, model file, semitones), so a repeat request for
+# the same video is a file lookup instead of a download + separation pass.
+CACHE_DIR = os.environ.get("KARAOKE_CACHE", os.path.expanduser("~/.cache/karaoke_cloud"))
+CACHE_MAX_BYTES = int(float(os.environ.get("KARAOKE_CACHE_GB", "10")) * 1024 ** 3)
+_lock = threading.Lock()
+
+def source_id(info):
+    """Stable identity of a download from yt-dlp's extract_info, or None if the extractor gave no ID."""
+    if not info or not info.get('id'): return None
+    # Flat playlist entries name the video's extractor in ie_key (extractor_key is the playlist's)
+    return f"{info.get('ie_key') or info.get('extractor_key') or info.get('extractor') or 'generic'}:{info['id']}"
+
+def cache_key(*parts):
+    if any(p is None for p in parts): return None
+    return hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def _entry_path(key, ext):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}{ext}")
+
+def _link_or_copy(src, dest):
+    if os.path.exists(dest): os.remove(dest)
+    try: os.link(src, dest)
+    except OSError: shutil.copyfile(src, dest)
+
+def fetch(key, dest):
+    """Materializes a cached artifact at dest; returns False on a miss."""
+    if not key: return False
+    path = _entry_path(key, os.path.splitext(dest)[1])
+    try:
+        _link_or_copy(path, dest)
+        os.utime(path)  # mtime doubles as the LRU clock
+        return True
+    except OSError:
+        return False
+
+def store(key, src):
+    if not key or not os.path.exists(src): return
+    path = _entry_path(key, os.path.splitext(src)[1])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part = f"{path}.{threading.get_ident()}.part"
+    try:
+        _link_or_copy(src, part)
+        os.replace(part, path)
+    finally:
+        if os.path.exists(part): os.remove(part)
+    evict()
+
+def evict(max_bytes=None):
+    """Deletes least recently used entries until the cache fits in max_bytes."""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        entries = []
+        for root, _, files in os.walk(CACHE_DIR):
+            for name in files:
+                if name.endswith(".part"): continue
+                path = os.path.join(root, name)
+                try: st = os.stat(path)
+                except OSError: continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes: break
+            try: os.remove(path)
+            except OSError: continue
+            total -= size
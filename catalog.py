@@ -0,0 +1,237 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+
+# --- LIBRARY CATALOG ---
+# On the Drive mount every listdir/exists/stat is a network round trip, so pairing each song's
+# _Inst/_Pitched/_Original/.lrc files and videos by probing the filesystem takes minutes for a
+# large library. The catalog keeps every delivered artifact with its size and mtime in SQLite on
+# local disk (Drive FUSE does not honour SQLite locking). Stages record what they publish; a
+# rescan only lists folders whose mtime moved and only stats names it has not seen (--full
+# restats everything), so batch jobs plan their work from indexed queries. Files edited in place
+# keep their folder mtime, so callers refresh() the few rows they are about to trust.
+CATALOG_DB = os.environ.get("KARAOKE_CATALOG", os.path.expanduser("~/.cache/karaoke_cloud_catalog.sqlite"))
+LIBRARY = None
+INSTRUMENTAL_KINDS = ("inst", "pitched")
+# (kind, pattern): group 1 is the song title, group 2 (when present) the key tag such as "_+4"
+ARTIFACT_NAMES = [
+    ("original", re.compile(r'^(.*)_Original\.mp3$')),
+    ("inst", re.compile(r'^(.*)_Inst\.mp3$')),
+    ("pitched", re.compile(r'^(.*)_Pitched(_[+-]\d+)?\.mp3$')),
+    ("karaoke", re.compile(r'^(.*)_Karaoke(_[+-]\d+)?\.(?:mp4|m3u8)$')),
+    ("full", re.compile(r'^(.*)_FullVocals\.mp4$')),
+    ("lyrics", re.compile(r'^(.*)\.lrc$')),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    library TEXT NOT NULL,
+    path TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    song TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    tag TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inputs TEXT,
+    PRIMARY KEY (library, path)
+);
+CREATE INDEX IF NOT EXISTS artifacts_song ON artifacts(library, kind, song, tag);
+CREATE INDEX IF NOT EXISTS artifacts_folder ON artifacts(library, folder);
+CREATE TABLE IF NOT EXISTS folders (
+    library TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL,
+    scanned_at REAL NOT NULL,
+    PRIMARY KEY (library, path)
+);
+"""
+
+def configure(root):
+    """Sets the library folder that record() and the queries use by default."""
+    global LIBRARY
+    LIBRARY = os.path.abspath(root)
+
+def connect():
+    os.makedirs(os.path.dirname(CATALOG_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(CATALOG_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def classify(name):
+    """(kind, song, tag) for a library file name, or None for anything else."""
+    for kind, pattern in ARTIFACT_NAMES:
+        m = pattern.match(name)
+        if m: return kind, m.group(1), (m.group(2) if pattern.groups > 1 else None) or ""
+    return None
+
+def relative(path, library=None):
+    """path relative to the library ('/'-separated), or None when it lies outside it or in a hidden folder."""
+    rel = os.path.relpath(os.path.abspath(path), library or LIBRARY)
+    parts = rel.split(os.sep)
+    if any(p.startswith(".") for p in parts): return None
+    return "/".join(parts)
+
+def _upsert(conn, library, rel, st, inputs=None):
+    kind, song, tag = classify(rel.rsplit("/", 1)[-1])
+    conn.execute("INSERT OR REPLACE INTO artifacts (library, path, folder, song, kind, tag, size, mtime_ns, inputs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 (library, rel, rel.rpartition("/")[0], song, kind, tag, st.st_size, st.st_mtime_ns, inputs))
+
+# --- WRITERS ---
+def record(path, inputs=None):
+    """Notes a file just published into the library; inputs optionally stamps what it was built from."""
+    if not LIBRARY: return
+    rel = relative(path)
+    if not rel or not classify(rel.rsplit("/", 1)[-1]): return
+    st = os.stat(path)
+    conn = connect()
+    try: _upsert(conn, LIBRARY, rel, st, inputs)
+    finally: conn.close()
+
+def refresh(paths):
+    """Restats files about to be trusted (an edit in place does not move the folder mtime the rescan
+    relies on); returns {relative path: row} for those that exist, after updating rows that changed."""
+    if not LIBRARY: return {}
+    rels = {relative(p): p for p in paths}
+    conn = connect()
+    try:
+        rows, changed, gone = {}, [], []
+        for rel, path in rels.items():
+            if not rel or not classify(rel.rsplit("/", 1)[-1]): continue
+            row = conn.execute("SELECT * FROM artifacts WHERE library = ? AND path = ?", (LIBRARY, rel)).fetchone()
+            try: st = os.stat(path)
+            except FileNotFoundError:
+                if row: gone.append(rel)
+                continue
+            if row and (row['size'], row['mtime_ns']) == (st.st_size, st.st_mtime_ns): rows[rel] = dict(row)
+            else: changed.append((rel, st))
+        if changed or gone:
+            conn.execute("BEGIN IMMEDIATE")
+            for rel, st in changed: _upsert(conn, LIBRARY, rel, st)
+            conn.executemany("DELETE FROM artifacts WHERE library = ? AND path = ?", [(LIBRARY, rel) for rel in gone])
+            conn.execute("COMMIT")
+            for rel, _ in changed: rows[rel] = dict(conn.execute("SELECT * FROM artifacts WHERE library = ? AND path = ?", (LIBRARY, rel)).fetchone())
+        return rows
+    finally:
+        conn.close()
+
+def set_inputs(path, inputs):
+    if not LIBRARY: return
+    conn = connect()
+    try: conn.execute("UPDATE artifacts SET inputs = ? WHERE library = ? AND path = ?", (inputs, LIBRARY, relative(path)))
+    finally: conn.close()
+
+# --- RESCANS ---
+def _forget(conn, library, folder):
+    """Drops a vanished folder with everything catalogued below it; returns the number of artifacts dropped."""
+    prefix = folder + "/"
+    removed = conn.execute("DELETE FROM artifacts WHERE library = ? AND (folder = ? OR substr(folder, 1, ?) = ?)", (library, folder, len(prefix), prefix)).rowcount
+    conn.execute("DELETE FROM folders WHERE library = ? AND (path = ? OR substr(path, 1, ?) = ?)", (library, folder, len(prefix), prefix))
+    return removed
+
+def _scan_folder(conn, library, folder, full):
+    """Updates one folder; returns (subfolders to visit, artifacts added or changed, artifacts removed)."""
+    st = os.stat(os.path.join(library, folder))  # before listing, so a file added meanwhile moves it again
+    known = conn.execute("SELECT mtime_ns FROM folders WHERE library = ? AND path = ?", (library, folder)).fetchone()
+    old_subfolders = [r['path'] for r in conn.execute("SELECT path FROM folders WHERE library = ? AND parent = ?", (library, folder))]
+    if known and known['mtime_ns'] == st.st_mtime_ns and not full: return old_subfolders, 0, 0
+
+    rows = {r['path']: r for r in conn.execute("SELECT path, size, mtime_ns FROM artifacts WHERE library = ? AND folder = ?", (library, folder))}
+    subfolders, seen, changed = [], set(), []
+    with os.scandir(os.path.join(library, folder)) as entries:
+        for entry in entries:
+            if entry.name.startswith("."): continue
+            rel = f"{folder}/{entry.name}" if folder else entry.name
+            if entry.is_dir():
+                subfolders.append(rel)
+                continue
+            if not classify(entry.name): continue
+            seen.add(rel)
+            if rel in rows and not full: continue  # writers record replacements, so only new names need a stat
+            est = entry.stat()
+            if rel in rows and (rows[rel]['size'], rows[rel]['mtime_ns']) == (est.st_size, est.st_mtime_ns): continue
+            changed.append((rel, est))
+    gone = [rel for rel in rows if rel not in seen]
+
+    conn.execute("BEGIN IMMEDIATE")
+    for rel, est in changed: _upsert(conn, library, rel, est)
+    conn.executemany("DELETE FROM artifacts WHERE library = ? AND path = ?", [(library, rel) for rel in gone])
+    removed = len(gone) + sum(_forget(conn, library, sub) for sub in set(old_subfolders) - set(subfolders))
+    conn.execute("INSERT OR REPLACE INTO folders (library, path, parent, mtime_ns, scanned_at) VALUES (?, ?, ?, ?, ?)",
+                 (library, folder, folder.rpartition("/")[0] if folder else None, st.st_mtime_ns, time.time()))
+    conn.execute("COMMIT")
+    return subfolders, len(changed), removed
+
+def scan(library=None, full=False):
+    """Brings the catalog in line with the library folder; returns (added or changed, removed) artifact counts."""
+    library = os.path.abspath(library) if library else LIBRARY
+    conn = connect()
+    changed = removed = 0
+    try:
+        pending = [""]
+        while pending:
+            folder = pending.pop()
+            try: subfolders, n_changed, n_removed = _scan_folder(conn, library, folder, full)
+            except FileNotFoundError:
+                if folder: removed += _forget(conn, library, folder)
+                continue
+            pending += subfolders
+            changed, removed = changed + n_changed, removed + n_removed
+    finally:
+        conn.close()
+    return changed, removed
+
+# --- QUERIES ---
+def artifacts(library=None, kinds=None):
+    """{relative path: row} for the library, optionally limited to some kinds."""
+    library = os.path.abspath(library) if library else LIBRARY
+    conn = connect()
+    try:
+        if kinds: rows = conn.execute(f"SELECT * FROM artifacts WHERE library = ? AND kind IN ({','.join('?' * len(kinds))})", (library, *kinds))
+        else: rows = conn.execute("SELECT * FROM artifacts WHERE library = ?", (library,))
+        return {r['path']: dict(r) for r in rows}
+    finally:
+        conn.close()
+
+def missing(kind="karaoke", library=None):
+    """Instrumental tracks that have lyrics but no artifact of kind for their key (e.g. no karaoke video yet)."""
+    library = os.path.abspath(library) if library else LIBRARY
+    conn = connect()
+    try:
+        rows = conn.execute(f"""SELECT a.* FROM artifacts a WHERE a.library = ? AND a.kind IN ({','.join('?' * len(INSTRUMENTAL_KINDS))})
+                                AND EXISTS (SELECT 1 FROM artifacts l WHERE l.library = a.library AND l.kind = 'lyrics' AND l.song = a.song)
+                                AND NOT EXISTS (SELECT 1 FROM artifacts v WHERE v.library = a.library AND v.kind = ? AND v.song = a.song AND v.tag = a.tag)
+                                ORDER BY a.song, a.tag""", (library, *INSTRUMENTAL_KINDS, kind)).fetchall()
+        return instrumentals(dict(r) for r in rows)
+    finally:
+        conn.close()
+
+def instrumentals(rows):
+    """One instrumental per (folder, song, tag), the rows that name a video. A single-key pitched job
+    (--keys 4) delivers Song_Inst.mp3 and Song_Pitched.mp3, which both map to Song_Karaoke.mp4; the
+    pitched one is what that job rendered, so it wins."""
+    chosen = {}
+    for row in rows:
+        if row['kind'] not in INSTRUMENTAL_KINDS: continue
+        key = (row['folder'], row['song'], row['tag'])
+        if key not in chosen or row['kind'] == "pitched": chosen[key] = row
+    return list(chosen.values())
+
+def main():
+    parser = argparse.ArgumentParser(description="Update and query the karaoke library catalog.")
+    parser.add_argument("library", nargs="?", default="/content/drive/MyDrive/KaraokeOutput")
+    parser.add_argument("--full", action="store_true", help="restat every file instead of only new names in changed folders")
+    parser.add_argument("--missing", choices=("karaoke", "full"), help="list tracks with lyrics but no video of this kind")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    changed, removed = scan(args.library, full=args.full)
+    print(f"🗂️ Catalog updated in {time.perf_counter() - start:.1f}s: {changed} new/changed, {removed} removed, {len(artifacts(args.library))} artifacts")
+    if args.missing:
+        for row in missing(args.missing, args.library): print(f"   {row['path']}")
+
+if __name__ == "__main__": main()
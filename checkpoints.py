@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from workspace import deliver
+
+# --- PER-TRACK STAGE CHECKPOINTS ---
+# Every track gets a directory (keyed by its source URL) holding state.json and the
+# intermediates that later stages still need. Each stage records its input fingerprint and
+# output artifacts when it finishes; a rerun restores every stage whose fingerprint still
+# matches and whose artifacts still exist, and starts working at the first one that does not.
+# Callers keep the root next to their outputs (on Drive in Colab) so it survives a recycled runtime.
+STATE_FILE = "state.json"
+_lock = threading.Lock()  # stages and background uploads of the same track both write state.json
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def file_fingerprint(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+    return h.hexdigest()[:16]
+
+def open_track(root, url):
+    path = os.path.join(root, hashlib.sha1(url.encode("utf-8")).hexdigest()[:16])
+    os.makedirs(path, exist_ok=True)
+    try:
+        with open(os.path.join(path, STATE_FILE), 'r', encoding='utf-8') as f: stages = json.load(f)['stages']
+    except (OSError, ValueError, KeyError):
+        stages = {}
+    return {'dir': path, 'url': url, 'stages': stages}
+
+def completed(ckpt, stage, fp, artifacts=True):
+    """Returns the stage's record if it finished with the same inputs (and, by default, its artifacts still exist)."""
+    rec = ckpt['stages'].get(stage)
+    if not rec or rec['fingerprint'] != fp: return None
+    if artifacts and not all(os.path.exists(p) for p in rec['artifacts'].values()): return None
+    return rec
+
+def record(ckpt, stage, fp, artifacts=None, **meta):
+    with _lock:
+        ckpt['stages'][stage] = {'fingerprint': fp, 'artifacts': artifacts or {}, 'meta': meta, 'finished_at': time.time()}
+        path = os.path.join(ckpt['dir'], STATE_FILE)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f: json.dump({'url': ckpt['url'], 'stages': ckpt['stages']}, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+def keep(ckpt, stage, fp, name, src, **meta):
+    """Copies a workspace intermediate into the checkpoint directory so it outlives the workspace, and
+    records the stage once the copy has landed. The copy goes through the background uploads, so a
+    multi-hundred-MB WAV never holds the stage (the separator above all) while it crawls onto Drive."""
+    dest = os.path.join(ckpt['dir'], name + os.path.splitext(src)[1])
+    with _lock: ckpt.setdefault('uploading', set()).add(dest)
+    def landed():
+        with _lock:
+            ckpt['uploading'].discard(dest)
+            if dest in ckpt.get('released', ()): os.remove(dest)  # the delivered audio made it unnecessary meanwhile
+        record(ckpt, stage, fp, {name: dest}, **meta)
+    deliver(src, dest, keep=True, then=landed)
+
+def release(ckpt):
+    """Deletes kept intermediates once the delivered files make them unnecessary; the records stay.
+    Copies still uploading are deleted as they land."""
+    with _lock:
+        ckpt['released'] = set(ckpt.get('uploading', ()))
+        for name in os.listdir(ckpt['dir']):
+            if name != STATE_FILE and not name.startswith("."): os.remove(os.path.join(ckpt['dir'], name))
@@ -0,0 +1,108 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import yt_dlp
+from yt_dlp.utils import parse_bytes
+import cache
+import telemetry
+
+# --- DOWNLOAD SESSIONS ---
+# One session per job: the playlist is listed once with extract_flat and those entries are handed
+# straight to the downloaders, so a track is resolved exactly once (and not at all on a cache hit).
+# Each download thread keeps its own YoutubeDL for the whole job, reusing extractor setup, cookies
+# and HTTP connections from track to track instead of rebuilding them per track.
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+TRACK_WORKERS = int(os.environ.get("KARAOKE_DL_WORKERS", "3"))  # tracks downloading at once
+FRAGMENT_WORKERS = int(os.environ.get("KARAOKE_DL_FRAGMENTS", "4"))  # parallel fragments per HLS/DASH track
+RATE_LIMIT = os.environ.get("KARAOKE_DL_RATE") or None  # e.g. "8M": bytes/s shared by all concurrent tracks
+
+class DownloadSession:
+    """Long-lived yt-dlp state for one job; use as a context manager or call close()."""
+
+    def __init__(self, workers=TRACK_WORKERS, fragments=FRAGMENT_WORKERS, rate_limit=RATE_LIMIT, cookiefile=None):
+        self.workers = max(1, workers)
+        self.base_opts = {'quiet': True, 'user_agent': USER_AGENT, 'nocheckcertificate': True}
+        if cookiefile: self.base_opts['cookiefile'] = cookiefile
+        self.download_opts = {**self.base_opts, 'format': 'bestaudio/best', 'outtmpl': '%(id)s.%(ext)s',
+                              'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'wav'}],
+                              'concurrent_fragment_downloads': max(1, fragments)}
+        rate = parse_bytes(rate_limit) if isinstance(rate_limit, str) else rate_limit
+        if rate: self.download_opts['ratelimit'] = max(1, rate // self.workers)  # yt-dlp limits each download separately
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = []
+        self._lister = None
+
+    def _track(self, ydl):
+        with self._lock: self._open.append(ydl)
+        return ydl
+
+    def _downloader(self):
+        if not hasattr(self._local, 'ydl'): self._local.ydl = self._track(yt_dlp.YoutubeDL(dict(self.download_opts)))
+        return self._local.ydl
+
+    def list(self, url):
+        """Flat entries of a playlist (title/id/url only), or [info] for a single track."""
+        if self._lister is None: self._lister = self._track(yt_dlp.YoutubeDL({**self.base_opts, 'extract_flat': True}))
+        info = self._lister.extract_info(url, download=False)
+        if 'entries' not in info: return [info]
+        return [entry for entry in info['entries'] if entry]
+
+    def fetch_audio(self, entry, temp_name):
+        """Puts entry's audio at temp_name.wav, from the cache when possible; returns (source_id, info)."""
+        audio = f"{temp_name}.wav"
+        sid = cache.source_id(entry)
+        if cache.fetch(cache.cache_key("audio", sid), audio): return sid, entry
+        ydl = self._downloader()
+        # Each thread owns its YoutubeDL, so pointing its output template at this track is safe
+        ydl.params['outtmpl']['default'] = f"{temp_name}.%(ext)s"
+        info = ydl.process_ie_result(dict(entry), download=True)
+        sid = cache.source_id(info)
+        cache.store(cache.cache_key("audio", sid), audio)
+        telemetry.add_io(outputs=[audio])
+        return sid, info
+
+    def close(self):
+        with self._lock:
+            ydls, self._open = self._open, []
+        for ydl in ydls: ydl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def url_entry(url):
+    """An unresolved entry for a URL that could not be listed; the downloader resolves it."""
+    return {'_type': 'url', 'url': url}
+
+def entry_url(entry, default=None):
+    """The page URL of a flat playlist entry; default for a fully resolved single track."""
+    return entry.get('url') if entry.get('_type') in ('url', 'url_transparent') else default
+
+# --- STANDALONE CHECK ---
+# e.g. serve a folder with `python -m http.server` and point this at a file URL to measure ingest.
+def main():
+    parser = argparse.ArgumentParser(description="Download a track or playlist as WAV with one shared session.")
+    parser.add_argument("url")
+    parser.add_argument("--out", default="./downloads")
+    parser.add_argument("--workers", type=int, default=TRACK_WORKERS)
+    parser.add_argument("--fragments", type=int, default=FRAGMENT_WORKERS)
+    parser.add_argument("--rate", default=RATE_LIMIT, help="total bandwidth cap, e.g. 8M")
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    with DownloadSession(args.workers, args.fragments, args.rate) as session:
+        entries = session.list(args.url)
+        print(f"📋 {len(entries)} track(s) listed in {time.perf_counter() - start:.1f}s")
+        fetch = lambda item: session.fetch_audio(item[1], os.path.join(args.out, f"{item[0]:03d}"))
+        with ThreadPoolExecutor(session.workers) as pool:
+            for sid, info in pool.map(fetch, enumerate(entries)): print(f"🎵 {info.get('title') or sid}")
+    total = sum(os.path.getsize(os.path.join(args.out, f)) for f in os.listdir(args.out))
+    elapsed = time.perf_counter() - start
+    print(f"✅ {total / 1e6:.1f} MB in {elapsed:.1f}s ({total / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
+
+if __name__ == "__main__": main()
@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import time
+
+# --- DURABLE JOB QUEUE ---
+# The dashboard only enqueues and polls; worker.py claims jobs and does the heavy work.
+# SQLite lives on local disk (Drive FUSE does not honour SQLite locking) and survives
+# Streamlit reruns, closed tabs and worker restarts.
+QUEUE_DB = os.environ.get("KARAOKE_QUEUE_DB", os.path.expanduser("~/.cache/karaoke_cloud_jobs.sqlite"))
+MAX_ACTIVE_JOBS = 20       # admission control: queued + running
+MAX_ATTEMPTS = 3
+HEARTBEAT_TIMEOUT = 60     # seconds without a worker heartbeat before it is considered dead
+ACTIVE_STATES = ("queued", "running")
+
+class QueueFull(Exception):
+    pass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, id);
+CREATE TABLE IF NOT EXISTS tracks (
+    job_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    state TEXT NOT NULL,
+    message TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+def connect():
+    os.makedirs(os.path.dirname(QUEUE_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(QUEUE_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def _row(row):
+    if row is None: return None
+    job = dict(row)
+    job['settings'] = json.loads(job['settings'])
+    return job
+
+# --- Dashboard side ---
+def enqueue(url, settings):
+    """Adds a job and returns its id; an identical active job is reused, a full queue raises QueueFull."""
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        existing = conn.execute("SELECT id FROM jobs WHERE url = ? AND settings = ? AND state IN (?, ?)", (url, json.dumps(settings, sort_keys=True), *ACTIVE_STATES)).fetchone()
+        if existing:
+            conn.execute("COMMIT")
+            return existing['id']
+        active = conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)", ACTIVE_STATES).fetchone()[0]
+        if active >= MAX_ACTIVE_JOBS:
+            conn.execute("ROLLBACK")
+            raise QueueFull(f"{active} jobs already waiting; try again when some have finished.")
+        now = time.time()
+        cur = conn.execute("INSERT INTO jobs (url, settings, created_at, updated_at) VALUES (?, ?, ?, ?)", (url, json.dumps(settings, sort_keys=True), now, now))
+        conn.execute("COMMIT")
+        return cur.lastrowid
+    finally:
+        conn.close()
+
+def list_jobs(limit=20):
+    conn = connect()
+    try: return [_row(r) for r in conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+    finally: conn.close()
+
+def job_tracks(job_id):
+    conn = connect()
+    try: return [dict(r) for r in conn.execute("SELECT * FROM tracks WHERE job_id = ? ORDER BY idx", (job_id,))]
+    finally: conn.close()
+
+def request_cancel(job_id):
+    conn = connect()
+    try:
+        # Queued jobs are cancelled at once; running ones stop feeding new tracks and finish in-flight work
+        conn.execute("UPDATE jobs SET state = 'cancelled', message = 'Cancelled', updated_at = ? WHERE id = ? AND state = 'queued'", (time.time(), job_id))
+        conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND state = 'running'", (time.time(), job_id))
+    finally:
+        conn.close()
+
+def retry(job_id):
+    conn = connect()
+    try: conn.execute("UPDATE jobs SET state = 'queued', attempts = 0, cancel_requested = 0, message = 'Retry queued', updated_at = ? WHERE id = ? AND state IN ('failed', 'cancelled')", (time.time(), job_id))
+    finally: conn.close()
+
+def worker_alive():
+    conn = connect()
+    try:
+        row = conn.execute("SELECT MAX(heartbeat) FROM workers").fetchone()
+        return bool(row[0]) and time.time() - row[0] < HEARTBEAT_TIMEOUT
+    finally:
+        conn.close()
+
+# --- Worker side ---
+def heartbeat(pid):
+    conn = connect()
+    try: conn.execute("INSERT OR REPLACE INTO workers (pid, heartbeat) VALUES (?, ?)", (pid, time.time()))
+    finally: conn.close()
+
+def recover():
+    """Requeues jobs left 'running' by a worker that died; finished tracks are skipped on resume.
+    A job that has already taken down MAX_ATTEMPTS workers (OOM, segfault) is failed instead."""
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE jobs SET state = 'failed', message = ?, updated_at = ? WHERE state = 'running' AND attempts >= ?",
+                     (f"Worker died during every attempt ({MAX_ATTEMPTS}/{MAX_ATTEMPTS})", time.time(), MAX_ATTEMPTS))
+        cur = conn.execute("UPDATE jobs SET state = 'queued', message = 'Resuming after restart', updated_at = ? WHERE state = 'running'", (time.time(),))
+        conn.execute("DELETE FROM workers")
+        conn.execute("COMMIT")
+        return cur.rowcount
+    finally:
+        conn.close()
+
+def claim():
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT * FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?", (time.time(), row['id']))
+        conn.execute("COMMIT")
+        job = _row(row)
+        job['state'], job['attempts'] = 'running', job['attempts'] + 1
+        return job
+    finally:
+        conn.close()
+
+def update_progress(job_id, progress, message):
+    conn = connect()
+    try: conn.execute("UPDATE jobs SET progress = ?, message = ?, updated_at = ? WHERE id = ?", (progress, message, time.time(), job_id))
+    finally: conn.close()
+
+def cancel_requested(job_id):
+    conn = connect()
+    try: return bool(conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+    finally: conn.close()
+
+def record_track(job_id, idx, title, state, message=""):
+    conn = connect()
+    try: conn.execute("INSERT OR REPLACE INTO tracks (job_id, idx, title, state, message) VALUES (?, ?, ?, ?, ?)", (job_id, idx, title, state, message))
+    finally: conn.close()
+
+def finished_tracks(job_id):
+    conn = connect()
+    try: return {r['idx'] for r in conn.execute("SELECT idx FROM tracks WHERE job_id = ? AND state = 'done'", (job_id,))}
+    finally: conn.close()
+
+def finish(job_id, state, message):
+    conn = connect()
+    try: conn.execute("UPDATE jobs SET state = ?, message = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END, updated_at = ? WHERE id = ?", (state, message, state, time.time(), job_id))
+    finally: conn.close()
+
+def fail(job_id, message):
+    """Marks a job failed, or requeues it while it still has attempts left."""
+    conn = connect()
+    try:
+        attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        state = "queued" if attempts < MAX_ATTEMPTS else "failed"
+        conn.execute("UPDATE jobs SET state = ?, message = ?, updated_at = ? WHERE id = ?", (state, f"{message} (attempt {attempts}/{MAX_ATTEMPTS})", time.time(), job_id))
+        return state
+    finally:
+        conn.close()
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import syncedlyrics
+
+# --- LYRICS LOOKUP CACHE ---
+# Hits are kept forever, misses for NEGATIVE_TTL, so batch runs over songs we have seen
+# before make no network requests at all. Cold lookups ask every provider at once and
+# take the first synced result instead of waiting on each provider's timeout in turn.
+LYRICS_CACHE_DIR = os.environ.get("KARAOKE_LYRICS_CACHE", os.path.expanduser("~/.cache/karaoke_cloud_lyrics"))
+NEGATIVE_TTL = 7 * 24 * 3600
+PROVIDER_TIMEOUT = 15
+PROVIDER_NAMES = ["Musixmatch", "Lrclib", "NetEase", "Megalobiz"]
+SYNCED_LINE = re.compile(r'^\[\d+:\d+(?:\.\d+)?\]', re.M)
+_pool = ThreadPoolExecutor(max_workers=16)
+_write_lock = threading.Lock()
+
+def _syncedlyrics_provider(name):
+    return lambda query: syncedlyrics.search(query, enhanced=True, providers=[name])
+
+# Providers are plain callables (query -> LRC text or None); pass your own to find_lyrics to stub the network.
+DEFAULT_PROVIDERS = {name: _syncedlyrics_provider(name) for name in PROVIDER_NAMES}
+
+def normalize_title(title):
+    title = title.lower()
+    title = re.sub(r'[\(\[][^\)\]]*(official|video|audio|lyrics?|hd|hq|remaster)[^\)\]]*[\)\]]', ' ', title)
+    title = re.sub(r'\.mp3$', '', title)
+    title = re.sub(r'[^\w\s-]', ' ', title).replace('_', ' ')
+    return " ".join(title.split())
+
+def _entry_path(title):
+    return os.path.join(LYRICS_CACHE_DIR, hashlib.sha1(normalize_title(title).encode("utf-8")).hexdigest() + ".json")
+
+def cached_lyrics(title):
+    """Returns (hit, lrc): hit is False when the title was never looked up or its miss has expired."""
+    try:
+        with open(_entry_path(title), 'r', encoding='utf-8') as f: entry = json.load(f)
+    except (OSError, ValueError):
+        return False, None
+    if entry.get('lrc'): return True, entry['lrc']
+    return time.time() - entry.get('fetched_at', 0) < NEGATIVE_TTL, None
+
+def remember_lyrics(title, lrc, provider=None):
+    os.makedirs(LYRICS_CACHE_DIR, exist_ok=True)
+    path = _entry_path(title)
+    entry = {'title': normalize_title(title), 'lrc': lrc or None, 'provider': provider, 'fetched_at': time.time()}
+    with _write_lock:
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f: json.dump(entry, f)
+        os.replace(f"{path}.tmp", path)
+
+def _is_synced(lrc):
+    return bool(lrc) and bool(SYNCED_LINE.search(lrc))
+
+def search_providers(query, providers=None, timeout=PROVIDER_TIMEOUT):
+    """Queries all providers concurrently; returns (provider, lrc, answered) for the first synced result.
+
+    answered is False when every provider failed or timed out, so a network outage is not cached as a miss.
+    """
+    providers = providers or DEFAULT_PROVIDERS
+    pending = {_pool.submit(fn, query): name for name, fn in providers.items()}
+    deadline, answered = time.time() + timeout, False
+    while pending:
+        done, _ = wait(pending, timeout=max(0, deadline - time.time()), return_when=FIRST_COMPLETED)
+        if not done: break  # the rest missed the deadline; their threads finish in the background
+        for future in done:
+            name = pending.pop(future)
+            try: lrc = future.result()
+            except Exception: continue
+            answered = True
+            if _is_synced(lrc):
+                for other in pending: other.cancel()
+                return name, lrc, True
+    return None, None, answered
+
+def find_lyrics(title, providers=None, use_cache=True):
+    if use_cache:
+        hit, lrc = cached_lyrics(title)
+        if hit: return lrc
+    provider, lrc, answered = search_providers(title, providers)
+    if use_cache and answered: remember_lyrics(title, lrc, provider)
+    return lrc
@@ -0,0 +1,148 @@
+import os
+import subprocess
+import catalog
+import telemetry
+from workspace import deliver
+
+# --- SHARED FFMPEG HELPERS ---
+# TV Style: Yellow Text, Noto Sans Font
+SUBTITLE_STYLE = "Fontname=Noto Sans,Fontsize=60,PrimaryColour=&H00FFFF,Outline=3,MarginV=50,Alignment=2"
+
+def probe_duration(path):
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path]
+    try: return float(subprocess.run(cmd, capture_output=True, text=True).stdout.strip())
+    except ValueError: return 0.0
+
+def probe_sample_rate(path, default=44100):
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=sample_rate", "-of", "default=nw=1:nk=1", path]
+    try: return int(subprocess.run(cmd, capture_output=True, text=True).stdout.strip())
+    except ValueError: return default
+
+def pitch_shift(input_file, outputs):
+    """Writes every {semitones: output_file} variant from a single decode of input_file.
+
+    One asplit branch per key: asetrate raises/lowers the pitch at the source's real sample
+    rate, aresample restores the rate and atempo undoes the speed change.
+    """
+    outputs = {s: path for s, path in outputs.items() if s != 0}
+    if not outputs: return
+    rate = probe_sample_rate(input_file)
+    labels = [f"p{i}" for i in range(len(outputs))]
+    graph = [f"[0:a]asplit={len(outputs)}" + "".join(f"[in{i}]" for i in range(len(outputs)))]
+    for i, semitones in enumerate(outputs):
+        factor = 2 ** (semitones / 12)
+        graph.append(f"[in{i}]asetrate={int(round(rate * factor))},aresample={rate},atempo={1 / factor:.6f}[{labels[i]}]")
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", input_file, "-filter_complex", ";".join(graph)]
+    for label, path in zip(labels, outputs.values()): cmd += ["-map", f"[{label}]", path]
+    telemetry.run(cmd, check=True)
+    telemetry.add_io([input_file], outputs.values())
+
+# Delivery Audio: jobs keep one lossless WAV per stage and encode to MP3 exactly once, at the end
+DELIVERY_AUDIO_ARGS = ["-c:a", "libmp3lame", "-q:a", "2"]
+
+def deliver_audio(src, dest):
+    """Encodes a lossless intermediate to the delivery MP3 beside it, then moves it into place."""
+    work = os.path.splitext(src)[0] + ".delivery.mp3"
+    telemetry.run(["ffmpeg", "-y", "-v", "error", "-i", src, "-vn"] + DELIVERY_AUDIO_ARGS + [work], check=True)
+    telemetry.add_io([src], [work])
+    return deliver(work, dest)
+
+# Render Presets: lyric videos are a black background whose text changes every few seconds,
+# so the "static" presets run at a low frame rate, tune x264 for still images and let
+# mpdecimate drop repeated frames (variable frame rate output). "tv_24fps" is the old full render.
+# Word-level .ass sweeps (\kf) change every frame while a line is sung, so .ass renders never go
+# below ASS_MIN_FPS (at 10 fps the fill visibly steps); mpdecimate still drops the still gaps.
+VIDEO_PRESETS = {
+    "tv_24fps":     {'size': "1920x1080", 'fps': 24, 'x264_preset': "ultrafast", 'tune': None,         'decimate': False},
+    "static_1080p": {'size': "1920x1080", 'fps': 10, 'x264_preset': "veryfast",  'tune': "stillimage", 'decimate': True},
+    "static_720p":  {'size': "1280x720",  'fps': 10, 'x264_preset': "veryfast",  'tune': "stillimage", 'decimate': True},
+}
+DEFAULT_VIDEO_PRESET = "static_1080p"
+ASS_MIN_FPS = 24
+
+def _thread_args(threads):
+    return ["-threads", str(threads), "-filter_threads", str(threads)] if threads else []
+
+def _video_args(srt_path, preset, threads=None):
+    p = dict(VIDEO_PRESETS[preset or DEFAULT_VIDEO_PRESET])
+    # .ass files (word-level karaoke) carry their own matching style; SRT gets it forced on
+    if srt_path.endswith(".ass"):
+        vf, p['fps'] = f"subtitles={srt_path}", max(p['fps'], ASS_MIN_FPS)
+    else:
+        vf = f"subtitles={srt_path}:force_style='{SUBTITLE_STYLE}'"
+    if p['decimate']: vf += f",mpdecimate=max={p['fps'] * 2}"  # keep at least one frame every 2s for seeking
+    args = ["-f", "lavfi", "-i", f"color=c=black:s={p['size']}:r={p['fps']}"]
+    out = ["-vf", vf, "-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", p['x264_preset'], "-g", str(p['fps'] * 10)]
+    if p['tune']: out += ["-tune", p['tune']]
+    if p['decimate']: out += ["-vsync", "vfr"]  # -fps_mode needs FFmpeg 5.1+; Colab's apt ffmpeg is 4.4
+    return args, out + _thread_args(threads)
+
+def create_video(audio_path, srt_path, output_path, preset=None, threads=None):
+    inputs, video_out = _video_args(srt_path, preset, threads)
+    # -shortest alone overshoots when mpdecimate holds frames back; the audio length bounds the render
+    cmd = ["ffmpeg", "-y", "-v", "error", "-stats"] + inputs + ["-i", audio_path] + video_out + ["-t", f"{probe_duration(audio_path):.3f}", "-shortest", output_path]
+    telemetry.run(cmd, check=True)
+    telemetry.add_io([audio_path, srt_path], [output_path])
+
+def render_lyric_track(srt_path, duration, output_path, preset=None, threads=None):
+    """Renders the silent subtitle video once; audio variants are muxed onto it afterwards."""
+    inputs, video_out = _video_args(srt_path, preset, threads)
+    cmd = ["ffmpeg", "-y", "-v", "error", "-stats"] + inputs + video_out + ["-t", f"{duration:.3f}", "-an", output_path]
+    telemetry.run(cmd, check=True)
+    telemetry.add_io([srt_path], [output_path])
+    telemetry.note(audio_seconds=duration)  # encode speed shows up as realtime_factor
+
+def _audio_track_args(audio_paths, titles=None):
+    """Inputs 1..n are the audio files: one AAC track each, the first one default."""
+    args = ["-map", "0:v:0"]
+    for i in range(len(audio_paths)): args += ["-map", f"{i + 1}:a:0"]
+    args += ["-c:a", "aac", "-b:a", "192k"]
+    for i, title in enumerate(titles or []): args += [f"-metadata:s:a:{i}", f"title={title}"]
+    for i in range(len(audio_paths)): args += [f"-disposition:a:{i}", "default" if i == 0 else "0"]
+    return args
+
+def mux_audio(video_path, audio_paths, output_path, titles=None, threads=None):
+    """Stream-copies the video and adds one audio track per input (first track is the default)."""
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", video_path]
+    for audio_path in audio_paths: cmd += ["-i", audio_path]
+    cmd += _audio_track_args(audio_paths, titles) + ["-c:v", "copy"] + _thread_args(threads)
+    cmd += ["-shortest", "-movflags", "+faststart", output_path]
+    telemetry.run(cmd, check=True)
+    telemetry.add_io([video_path] + list(audio_paths), [output_path])
+
+# Streaming Output: a faststart MP4 cannot be played until ffmpeg exits, so long tracks keep
+# the TV waiting for the whole encode. In a streaming format the video is written in place as
+# it encodes: "fmp4" is one fragmented MP4 (a self-contained fragment per keyframe), "hls" is
+# fMP4 segments plus an EVENT playlist that ffmpeg closes with ENDLIST when done. Either way the
+# finished output is final as written, with no remux pass.
+STREAM_FORMATS = ("fmp4", "hls")
+DEFAULT_STREAM = os.environ.get("KARAOKE_STREAM") or None
+STREAM_SEGMENT_SECONDS = 4
+
+def stream_path(video_path, stream):
+    """Where a streamed video lands: the .mp4 itself (fmp4) or Name/Name.m3u8 beside its segments (hls)."""
+    if stream != "hls": return video_path
+    folder = os.path.splitext(video_path)[0]
+    return os.path.join(folder, os.path.basename(folder) + ".m3u8")
+
+def _stream_args(output_path, stream):
+    keyframes = ["-force_key_frames", f"expr:gte(t,n_forced*{STREAM_SEGMENT_SECONDS})"]  # a fragment every few seconds
+    if stream == "hls":
+        folder = os.path.dirname(output_path)
+        os.makedirs(folder, exist_ok=True)
+        return keyframes + ["-f", "hls", "-hls_time", str(STREAM_SEGMENT_SECONDS), "-hls_playlist_type", "event",
+                            "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+                            "-hls_segment_filename", os.path.join(folder, "seg_%05d.m4s"), output_path]
+    return keyframes + ["-movflags", "+frag_keyframe+empty_moov+default_base_moof", output_path]
+
+def stream_video(srt_path, audio_paths, output_path, stream, preset=None, threads=None, titles=None, duration=None):
+    """Lyrics and audio in one encode, playable from output_path (see stream_path) while it is still being written."""
+    inputs, video_out = _video_args(srt_path, preset, threads)
+    duration = duration or probe_duration(audio_paths[0])
+    cmd = ["ffmpeg", "-y", "-v", "error", "-stats"] + inputs
+    for audio_path in audio_paths: cmd += ["-i", audio_path]
+    cmd += _audio_track_args(audio_paths, titles) + video_out + ["-t", f"{duration:.3f}", "-shortest"] + _stream_args(output_path, stream)
+    telemetry.run(cmd, check=True)
+    folder = os.path.dirname(output_path)
+    telemetry.add_io([srt_path] + list(audio_paths), [os.path.join(folder, f) for f in os.listdir(folder)] if stream == "hls" else [output_path])
+    catalog.record(output_path)
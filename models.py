@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+import soundfile as sf
+from audio_separator.separator import Separator
+
+# --- WARM MODEL REGISTRY ---
+# Module state lives for the whole Python process, so Streamlit reruns and concurrent
+# sessions share one loaded separator per model file instead of paying the cold start
+# (download check + ONNX session creation) on every button click.
+IDLE_TIMEOUT = 30 * 60
+REAPER_INTERVAL = 60
+_models = {}
+_registry_lock = threading.Lock()
+_reaper = None
+
+# --- SEPARATOR PROFILES ---
+# Named speed/quality trade-offs passed to audio-separator as mdx_params. segment_size stays at
+# the models' dim_t (256) so inference keeps running on ONNX Runtime instead of a torch
+# conversion; overlap is the quality knob. batch_size and threads only change throughput, and
+# `python models.py --calibrate` measures them per host (see CALIBRATION_FILE).
+PROFILES = {
+    "quality":  {'segment_size': 256, 'overlap': 0.5,  'batch_size': 1, 'threads': None},
+    "balanced": {'segment_size': 256, 'overlap': 0.25, 'batch_size': 1, 'threads': None},  # audio-separator defaults
+    "fast":     {'segment_size': 256, 'overlap': 0.1,  'batch_size': 1, 'threads': None},
+}
+DEFAULT_PROFILE = os.environ.get("KARAOKE_SEPARATOR_PROFILE", "balanced")
+CALIBRATION_FILE = os.environ.get("KARAOKE_CALIBRATION", os.path.expanduser("~/.cache/karaoke_cloud_separator.json"))
+# Only the instrumental is ever used; KARAOKE_ALL_STEMS=1 writes the vocal stem to the workspace too
+INSTRUMENTAL_ONLY = os.environ.get("KARAOKE_ALL_STEMS") != "1"
+
+def load_calibration():
+    try:
+        with open(CALIBRATION_FILE, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def profile_settings(model_filename, profile=None):
+    """The profile's settings, with this host's calibrated batch size and threads when there are some."""
+    profile = profile or DEFAULT_PROFILE
+    settings = dict(PROFILES[profile])
+    tuned = load_calibration().get(f"{model_filename}|{profile}")
+    if tuned and tuned.get('cpu_count') == os.cpu_count(): settings.update(batch_size=tuned['batch_size'], threads=tuned['threads'])
+    return settings
+
+def stems_id(model_filename, profile=None):
+    """Identity of the stems a model + profile produce, for cache keys and checkpoint fingerprints."""
+    profile = profile or DEFAULT_PROFILE
+    return model_filename if profile == "balanced" else f"{model_filename}@{profile}"
+
+_onnx_options_lock = threading.Lock()
+_torch_default_threads = None
+
+@contextmanager
+def _onnx_threads(threads):
+    """audio-separator creates its ONNX session inside load_model() and exposes no SessionOptions,
+    so the class is swapped while the model loads to set the session's intra-op thread count."""
+    if not threads:
+        yield
+        return
+    import onnxruntime as ort
+    original = ort.SessionOptions
+    def options():
+        opts = original()
+        opts.intra_op_num_threads = threads
+        return opts
+    with _onnx_options_lock:
+        ort.SessionOptions = options
+        try: yield
+        finally: ort.SessionOptions = original
+
+def _set_threads(threads):
+    """torch runs the STFTs around the ONNX session; None puts back the process default."""
+    global _torch_default_threads
+    try: import torch
+    except ImportError: return
+    if _torch_default_threads is None: _torch_default_threads = torch.get_num_threads()
+    torch.set_num_threads(threads or _torch_default_threads)
+
+def _create(model_filename, settings):
+    mdx_params = {'hop_length': 1024, 'enable_denoise': False, **{k: settings[k] for k in ('segment_size', 'overlap', 'batch_size')}}
+    # Lossless stems; MP3 is encoded once at delivery
+    separator = Separator(output_format="WAV", output_single_stem="Instrumental" if INSTRUMENTAL_ONLY else None, mdx_params=mdx_params)
+    with _onnx_threads(settings['threads']): separator.load_model(model_filename=model_filename)
+    _set_threads(settings['threads'])
+    return separator
+
+def _load(entry, model_filename, profile):
+    start = time.time()
+    entry['separator'] = _create(model_filename, profile_settings(model_filename, profile))
+    entry['load_seconds'] = time.time() - start
+    entry['loads'] += 1
+    print(f"🧠 Loaded {model_filename} ({profile or DEFAULT_PROFILE}) in {entry['load_seconds']:.1f}s")
+
+def _entry(model_filename, profile):
+    global _reaper
+    key = (model_filename, profile or DEFAULT_PROFILE)
+    with _registry_lock:
+        entry = _models.get(key)
+        if entry is None:
+            entry = _models[key] = {'separator': None, 'lock': threading.RLock(), 'last_used': time.time(), 'load_seconds': None, 'loads': 0}
+        entry['last_used'] = time.time()  # so the reaper does not pick it before the caller takes its lock
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reap_forever, daemon=True)
+            _reaper.start()
+    return key, entry
+
+@contextmanager
+def _locked_entry(model_filename, profile):
+    """Yields the registry entry with its lock held. evict_idle can still drop an entry between _entry()
+    and the lock, and loading into that orphan would put a second copy of the model in memory."""
+    while True:
+        key, entry = _entry(model_filename, profile)
+        with entry['lock']:
+            with _registry_lock: current = _models.get(key) is entry
+            if current:
+                yield entry
+                return
+
+@contextmanager
+def use_separator(model_filename, profile=None):
+    """Yields the warm separator for model_filename, holding its lock so only one job runs on it at a time."""
+    with _locked_entry(model_filename, profile) as entry:
+        if entry['separator'] is None: _load(entry, model_filename, profile)
+        entry['last_used'] = time.time()
+        try:
+            yield entry['separator']
+        finally:
+            entry['last_used'] = time.time()
+
+def warm(model_filename, profile=None):
+    """Loads the model ahead of the first job and returns how long the load took (0 when already warm)."""
+    with _locked_entry(model_filename, profile) as entry:
+        if entry['separator'] is not None: return 0.0
+        _load(entry, model_filename, profile)
+        return entry['load_seconds']
+
+def evict_idle(max_idle=None):
+    max_idle = IDLE_TIMEOUT if max_idle is None else max_idle
+    now = time.time()
+    with _registry_lock:
+        for name, entry in list(_models.items()):
+            if now - entry['last_used'] < max_idle: continue
+            if not entry['lock'].acquire(blocking=False): continue  # busy separating
+            try:
+                entry['separator'] = None
+                del _models[name]
+                print(f"💤 Unloaded idle model {name[0]} ({name[1]})")
+            finally:
+                entry['lock'].release()
+
+def _reap_forever():
+    while True:
+        time.sleep(REAPER_INTERVAL)
+        evict_idle()
+
+def model_stats():
+    with _registry_lock:
+        return {f"{name[0]} ({name[1]})": {'loaded': e['separator'] is not None, 'load_seconds': e['load_seconds'], 'idle_seconds': time.time() - e['last_used'], 'loads': e['loads']} for name, e in _models.items()}
+
+# --- CALIBRATION ---
+# Separates a synthetic clip with every batch size / thread count candidate for one profile and
+# saves the fastest for this host; profile_settings() applies it while the CPU count matches.
+CALIBRATION_SECONDS = 20
+CALIBRATION_BATCH_SIZES = (1, 2, 4, 8)
+
+def synthetic_clip(path, seconds=CALIBRATION_SECONDS, rate=44100):
+    """Chord stabs, a bass line and noise hits: enough spectral content to exercise every model window."""
+    t = np.arange(int(seconds * rate)) / rate
+    beat = (t * 2) % 1
+    chord = sum(np.sin(2 * np.pi * f * t) for f in (261.6, 329.6, 392.0)) * np.exp(-3 * beat) / 3
+    bass = np.sin(2 * np.pi * 55 * (1 + (t // 2) % 4 / 4) * t) * 0.5
+    hits = np.random.default_rng(0).normal(0, 1, len(t)) * np.exp(-40 * ((t * 4) % 1)) * 0.3
+    mono = (0.4 * chord + 0.3 * bass + hits).astype(np.float32)
+    sf.write(path, np.stack([mono, np.roll(mono, 441)], axis=1), rate)
+    return path
+
+def _thread_candidates():
+    cores = os.cpu_count() or 1
+    return sorted({None, cores, max(1, cores // 2)}, key=lambda n: n or 0)
+
+def calibrate(model_filename, profile=None, seconds=CALIBRATION_SECONDS):
+    """Times every candidate on a synthetic clip, saves the fastest and returns (best, results)."""
+    profile = profile or DEFAULT_PROFILE
+    work = tempfile.mkdtemp(prefix="karaoke_calibrate_")
+    results = []
+    try:
+        clip = synthetic_clip(os.path.join(work, "clip.wav"), seconds)
+        for batch_size in CALIBRATION_BATCH_SIZES:
+            for threads in _thread_candidates():
+                settings = {**PROFILES[profile], 'batch_size': batch_size, 'threads': threads}
+                separator = _create(model_filename, settings)
+                separator.output_dir = work
+                if getattr(separator, 'model_instance', None) is not None: separator.model_instance.output_dir = work
+                separator.separate(clip)  # first run pays lazy initialisation
+                start = time.perf_counter()
+                for f in separator.separate(clip):
+                    path = f if os.path.isabs(f) else os.path.join(work, os.path.basename(f))
+                    if os.path.exists(path): os.remove(path)
+                rtf = seconds / max(time.perf_counter() - start, 1e-9)
+                results.append({'batch_size': batch_size, 'threads': threads, 'realtime_factor': round(rtf, 2)})
+                print(f"   ⏱️ batch {batch_size}, threads {threads or 'default'}: {rtf:.1f}x realtime")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    best = max(results, key=lambda r: r['realtime_factor'])
+    saved = load_calibration()
+    saved[f"{model_filename}|{profile}"] = {**best, 'cpu_count': os.cpu_count(), 'calibrated_at': time.time()}
+    os.makedirs(os.path.dirname(CALIBRATION_FILE) or ".", exist_ok=True)
+    with open(f"{CALIBRATION_FILE}.tmp", 'w', encoding='utf-8') as f: json.dump(saved, f, indent=2, sort_keys=True)
+    os.replace(f"{CALIBRATION_FILE}.tmp", CALIBRATION_FILE)
+    return best, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Separator profiles: show them or calibrate one for this host.")
+    parser.add_argument("--calibrate", action="store_true", help="benchmark batch sizes and thread counts on a synthetic clip")
+    parser.add_argument("--model", action="append", help="model file (repeatable); default: the CLI and dashboard models")
+    parser.add_argument("--profile", choices=list(PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument("--seconds", type=float, default=CALIBRATION_SECONDS, help="length of the synthetic clip")
+    args = parser.parse_args()
+    model_files = args.model or ["UVR_MDXNET_KARA_2.onnx", "UVR-MDX-NET-Inst_HQ_3.onnx"]
+    for model_filename in model_files:
+        if args.calibrate:
+            print(f"🔬 Calibrating {model_filename} ({args.profile}) on {os.cpu_count()} CPUs...")
+            best, _ = calibrate(model_filename, args.profile, args.seconds)
+            print(f"✅ Saved batch {best['batch_size']}, threads {best['threads'] or 'default'} ({best['realtime_factor']}x realtime) to {CALIBRATION_FILE}")
+        else:
+            print(f"{model_filename} ({args.profile}): {profile_settings(model_filename, args.profile)}")
+
+if __name__ == "__main__": main()
@@ -0,0 +1,52 @@
+import queue
+import threading
+import telemetry
+
+# --- STAGED PIPELINE ENGINE ---
+# Each stage is a (name, func, workers) tuple. Stages are linked by bounded queues so a
+# slow stage applies back-pressure instead of letting finished downloads pile up on disk.
+DONE = object()
+
+def _stage_worker(name, func, inbox, outbox):
+    while True:
+        job = inbox.get()
+        if job is DONE: break
+        if not job.get('error'):
+            try:
+                with telemetry.span(name, track=job.get('title')) as rec:
+                    job = func(job) or job
+                    rec['track'] = job.get('title')  # the download stage learns the title
+            except Exception as e:
+                job['error'] = f"{name}: {e}"
+        outbox.put(job)
+
+def _close_stage(threads, outbox, next_workers):
+    for t in threads: t.join()
+    for _ in range(next_workers): outbox.put(DONE)
+
+def _feed(jobs, inbox, workers, errors):
+    # A failing jobs iterable (e.g. a DB error while checking for cancellation) still closes the
+    # pipeline, so the jobs already inside drain and run_pipeline re-raises instead of hanging
+    try:
+        for job in jobs: inbox.put(job)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        for _ in range(workers): inbox.put(DONE)
+
+def run_pipeline(jobs, stages, queue_size=2):
+    """Streams job dicts through the stages concurrently and yields each one as it leaves the last stage.
+    An exception raised by the jobs iterable is re-raised once the jobs already fed have come out."""
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+    for i, (name, func, workers) in enumerate(stages):
+        threads = [threading.Thread(target=_stage_worker, args=(name, func, queues[i], queues[i + 1]), daemon=True) for _ in range(workers)]
+        for t in threads: t.start()
+        next_workers = stages[i + 1][2] if i + 1 < len(stages) else 1
+        threading.Thread(target=_close_stage, args=(threads, queues[i + 1], next_workers), daemon=True).start()
+    threading.Thread(target=_feed, args=(jobs, queues[0], stages[0][2], errors), daemon=True).start()
+    while True:
+        job = queues[-1].get()
+        if job is DONE: break
+        yield job
+    if errors: raise errors[0]
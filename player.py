@@ -0,0 +1,20 @@
+import os
+import shutil
+
+# --- HTML PLAYER ---
+# Player.html ships next to this file; the CLI and the dashboard copy the same asset into their
+# output folder, so there is one player to maintain. Copies left by older versions are refreshed.
+PLAYER_ASSET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Player.html")
+
+def create_flashcard_player(output_dir):
+    """Copies the Ultimate HTML Player (Group Sync & Tap-to-Catch-Up) into output_dir when missing or outdated."""
+    player_path = os.path.join(output_dir, "Player.html")
+    with open(PLAYER_ASSET, 'rb') as f: asset = f.read()
+    if os.path.exists(player_path):
+        with open(player_path, 'rb') as f:
+            if f.read() == asset: return None
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{player_path}.tmp"
+    shutil.copyfile(PLAYER_ASSET, tmp_path)
+    os.replace(tmp_path, player_path)
+    return player_path
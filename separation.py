@@ -0,0 +1,65 @@
+import os
+import time
+import numpy as np
+import soundfile as sf
+import telemetry
+from media import probe_duration
+from workspace import separate_in
+
+# --- STREAMING (WINDOWED) SEPARATION ---
+# Long inputs such as Mixcloud DJ sets are cut into overlapping windows with ffmpeg, each
+# window is separated on its own and the overlaps are crossfaded straight into the output
+# file, so peak memory depends on the window length and not on the length of the set.
+CHUNK_THRESHOLD = 15 * 60   # seconds; shorter tracks are separated in one pass
+WINDOW_SECONDS = 120
+OVERLAP_SECONDS = 5
+
+def _pick_instrumental(files):
+    return next(f for f in files if "Instrumental" in f)
+
+def separate_instrumental(separator, audio_path, workspace, progress=None):
+    """Returns the path of the instrumental stem, switching to windowed separation for long inputs."""
+    duration = probe_duration(audio_path)
+    telemetry.note(audio_seconds=duration)  # separation real-time factor
+    if duration <= CHUNK_THRESHOLD: inst = _pick_instrumental(separate_in(separator, audio_path, workspace))
+    else: inst = separate_chunked(separator, audio_path, workspace, progress=progress)
+    telemetry.add_io([audio_path], [inst])
+    return inst
+
+def separate_chunked(separator, audio_path, workspace, window=WINDOW_SECONDS, overlap=OVERLAP_SECONDS, progress=None):
+    """Separates audio_path window by window, calling progress(done, total, realtime_factor) after each window."""
+    duration = probe_duration(audio_path)
+    total = max(1, int(np.ceil(duration / window)))
+    chunk_dir = os.path.join(workspace, "chunks")
+    os.makedirs(chunk_dir, exist_ok=True)
+    out_wav = os.path.join(workspace, "instrumental_stream.wav")  # lossless; encoded once at delivery
+    writer, tail, started = None, None, time.time()
+    try:
+        for i in range(total):
+            start = i * window
+            chunk = os.path.join(chunk_dir, f"window_{i:04d}.wav")
+            telemetry.run(["ffmpeg", "-y", "-v", "error", "-ss", f"{start:.3f}", "-t", f"{window + overlap:.3f}", "-i", audio_path, "-ac", "2", chunk], check=True)
+            files = separate_in(separator, chunk, chunk_dir)
+            data, sr = sf.read(_pick_instrumental(files), dtype="float32", always_2d=True)
+            for f in files + [chunk]:
+                if os.path.exists(f): os.remove(f)
+
+            if tail is not None:
+                n = min(len(tail), len(data))
+                fade = np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+                data[:n] = tail[:n] * (1.0 - fade) + data[:n] * fade
+            keep = int(window * sr)
+            if i < total - 1 and len(data) > keep:
+                data, tail = data[:keep], data[keep:].copy()
+            else:
+                tail = None
+
+            if writer is None: writer = sf.SoundFile(out_wav, "w", samplerate=sr, channels=data.shape[1], subtype="PCM_16")
+            writer.write(data)
+            if progress:
+                processed = min(duration, (i + 1) * window)
+                progress(i + 1, total, processed / max(time.time() - started, 1e-6))
+    finally:
+        if writer is not None: writer.close()
+
+    return out_wav
@@ -0,0 +1,229 @@
+import os
+from functools import partial
+import acoustic
+import cache
+import checkpoints
+import lyrics
+import models
+import subtitles
+import telemetry
+from media import create_video, deliver_audio, mux_audio, pitch_shift, probe_duration, render_lyric_track, stream_path, stream_video
+from separation import separate_instrumental
+from workspace import create_workspace, deliver
+
+# --- TRACK STAGES ---
+# download -> lyrics -> separate -> encode for one track, shared by cli.py and worker.py.
+# Folders, model and video options come in a settings dict (see settings()); per-track choices
+# (keys, generate_video, video_preset) travel on the job. Each job works inside its own scratch
+# directory; only finished files are delivered to the output folder, by background uploads that
+# the caller waits for at the end (workspace.deliver / flush).
+def settings(output_dir, video_dir, checkpoint_dir, model, profile, subtitle_ext=".ass", stream=None):
+    return {'output_dir': output_dir, 'video_dir': video_dir, 'checkpoint_dir': checkpoint_dir, 'model': model, 'profile': profile,
+            'stems_id': models.stems_id(model, profile), 'subtitle_ext': subtitle_ext, 'stream': stream}
+
+def pipeline_stages(cfg, download_workers, lyrics_workers, encode_workers):
+    """The (name, func, workers) list for pipeline.run_pipeline."""
+    return [
+        ("download", partial(download_track, cfg), download_workers),
+        ("lyrics", partial(fetch_lyrics, cfg), lyrics_workers),
+        ("separate", partial(separate_track, cfg), 1),  # single worker owns the loaded model
+        ("encode", partial(render_track, cfg), encode_workers),
+    ]
+
+def track_titles(raw_title):
+    """(file-safe title, lyrics search title) for a source title."""
+    title = "".join([c for c in raw_title if c.isalnum() or c in (' ', '-', '_')]).strip()
+    return title, raw_title.replace("(Official Video)", "").replace(".mp3", "").replace("_", " ").strip()
+
+def key_suffix(semitones, keys):
+    """Single-key jobs keep the classic names; multi-key jobs tag each variant with its shift."""
+    return "" if len(keys) == 1 or semitones == 0 else f"_{semitones:+d}"
+
+def get_lyrics(clean_title):
+    print(f"      🔎 Searching lyrics database for '{clean_title}'...")
+    try:
+        return lyrics.find_lyrics(clean_title)
+    except: return None
+
+def download_track(cfg, job):
+    ckpt = job['ckpt'] = checkpoints.open_track(cfg['checkpoint_dir'], job['url'])
+    fp = job['fp'] = {'download': checkpoints.fingerprint(job['url'])}
+    fp['separate'] = checkpoints.fingerprint(fp['download'], cfg['stems_id'])
+    fp['pitch'] = checkpoints.fingerprint(fp['separate'], job['keys'])
+    # Once the delivered audio exists the download and separation intermediates are not needed
+    job['pitch_done'] = bool(checkpoints.completed(ckpt, "pitch", fp['pitch']))
+    job['workspace'] = create_workspace()
+    done = checkpoints.completed(ckpt, "download", fp['download'], artifacts=not job['pitch_done'])
+    if done:
+        # The title claimed at download time names every delivered file, so it is restored, not re-derived
+        job.update(done['meta'])
+        if 'title' not in done['meta']: job['title'] = acoustic.claim_title(job['title'], job['source_id'] or job['url'])  # older worker checkpoints
+        job['temp_audio'] = done['artifacts'].get('audio')
+        print(f"\n⏩ Resuming: {job['title']}")
+        identify_recording(job)
+        return job
+    temp_name = os.path.join(job['workspace'], os.path.basename(job['workspace']))
+    job['temp_audio'] = f"{temp_name}.wav"
+    job['source_id'], info = job['downloads'].fetch_audio(job['entry'], temp_name)
+    if info is job['entry']: print(f"      ♻️ Cached download: {info.get('title')}")
+    job['title'], job['clean_title'] = track_titles(info.get('title', 'Unknown Track'))
+    # A different song already published under this title gets "Title (2)" instead of overwriting it
+    job['title'] = acoustic.claim_title(job['title'], job['source_id'] or job['url'])
+    identify_recording(job)
+
+    checkpoints.keep(ckpt, "download", fp['download'], 'audio', job['temp_audio'], title=job['title'], clean_title=job['clean_title'], source_id=job['source_id'])
+    print(f"\n🎵 Downloaded: {job['title']}")
+    return job
+
+def identify_recording(job):
+    """Fingerprints the download and looks up an earlier upload of the same recording."""
+    if job['pitch_done'] or not job.get('temp_audio'): return
+    job['acoustic'] = acoustic.fingerprint(job['temp_audio'])
+    job['match'] = acoustic.identify(job['acoustic'], exclude=job.get('source_id'))
+    if job['match']: print(f"      🔁 Same recording as {job['match']['title']} ({job['match']['offset']:+.2f}s): {job['title']}")
+
+def fetch_lyrics(cfg, job):
+    fp = checkpoints.fingerprint(job['clean_title'])
+    done = checkpoints.completed(job['ckpt'], "lyrics", fp)
+    if done:
+        job['lrc_work'], job['lyrics_found'] = done['artifacts']['lrc'], True
+        job['lrc_out'] = job['lrc_work']
+        return job
+    match = job.get('match')
+    if match and match['lrc'] and os.path.exists(match['lrc']):
+        with open(match['lrc'], "r", encoding="utf-8") as f: lrc = subtitles.shift_lrc(f.read(), -match['offset'])
+    else:
+        lrc = get_lyrics(job['clean_title'])
+    if lrc:
+        job['lrc_work'] = os.path.join(job['workspace'], "lyrics.lrc")
+        with open(job['lrc_work'], "w", encoding="utf-8") as f: f.write(lrc)
+        lrc_out = job['lrc_out'] = deliver(job['lrc_work'], f"{cfg['output_dir']}/{job['title']}.lrc", keep=True)
+        checkpoints.record(job['ckpt'], "lyrics", fp, {'lrc': lrc_out})
+        job['lyrics_found'] = True
+        print(f"      📝 Lyrics saved: {job['title']}")
+    else:
+        print(f"      ⚠️ No lyrics found: {job['title']}")
+    return job
+
+def reuse_match(job, stems_id):
+    """Copies the stem of an earlier upload of this recording into inst_work; False when there is none."""
+    if not job.get('acoustic'): return False
+    if not job.get('match'):
+        # Tracks are only registered once separated, so a duplicate a few tracks back in the same
+        # playlist was not indexed yet at download time; it may well be by now
+        job['match'] = acoustic.identify(job['acoustic'], exclude=job.get('source_id'))
+        if job['match']: print(f"      🔁 Same recording as {job['match']['title']} ({job['match']['offset']:+.2f}s): {job['title']}")
+    return bool(job['match']) and acoustic.reuse_stem(job['match'], job['inst_work'], job['acoustic']['duration'], stems_id)
+
+def separate_track(cfg, job):
+    done = checkpoints.completed(job['ckpt'], "separate", job['fp']['separate'], artifacts=not job['pitch_done'])
+    if done:
+        job['inst_work'] = done['artifacts'].get('inst')
+        return job
+    stems_id = cfg['stems_id']
+    inst_key = cache.cache_key("inst", job.get('source_id'), stems_id)
+    job['inst_work'] = os.path.join(job['workspace'], "instrumental.wav")
+    if cache.fetch(inst_key, job['inst_work']):
+        print(f"      ♻️ Cached stems: {job['title']}")
+    elif reuse_match(job, stems_id):
+        print(f"      🔁 Reused stems of {job['match']['title']}: {job['title']}")
+        cache.store(inst_key, job['inst_work'])
+    else:
+        print(f"      🎻 Separating stems: {job['title']}")
+        report = lambda done, total, rtf: print(f"      🎻 {job['title']}: window {done}/{total} ({rtf:.1f}x realtime)")
+        with models.use_separator(cfg['model'], cfg['profile']) as separator:
+            job['inst_work'] = separate_instrumental(separator, job['temp_audio'], job['workspace'], progress=report)
+        cache.store(inst_key, job['inst_work'])
+    if job.get('acoustic'): acoustic.register(job.get('source_id'), job['title'], job['acoustic'], job.get('lrc_out'))
+    checkpoints.keep(job['ckpt'], "separate", job['fp']['separate'], 'inst', job['inst_work'])
+    return job
+
+def render_track(cfg, job):
+    done = checkpoints.completed(job['ckpt'], "pitch", job['fp']['pitch'])
+    if done:
+        # Audio already delivered: videos are made from the delivered files, like late lyrics
+        job['deliveries'] = {int(name[4:]): path for name, path in done['artifacts'].items() if name.startswith("key_")}
+        job['original_path'] = done['artifacts']['original']
+        job['final_inst'] = done['meta'].get('final_inst', job['deliveries'][0])
+        variants = job['deliveries']
+    else:
+        with telemetry.span("pitch", track=job['title']): variants = deliver_track_audio(cfg, job)
+    if job['generate_video'] and job.get('lyrics_found'):
+        try:
+            with telemetry.span("video", track=job['title']): make_videos(cfg, job, job['lrc_work'], variants, job['workspace'])
+        except Exception as e:
+            job['video_error'] = str(e)
+            print(f"      ⚠️ Video Error: {e}")
+    return job
+
+def deliver_track_audio(cfg, job):
+    """Delivers Original/Inst/Pitched MP3s and returns the lossless variant per key for the video step."""
+    output_dir, stems_id = cfg['output_dir'], cfg['stems_id']
+    # Delivery MP3s are encoded straight from the lossless intermediates, once each
+    job['original_path'] = deliver_audio(job['temp_audio'], f"{output_dir}/{job['title']}_Original.mp3")
+    job['final_inst'] = deliver_audio(job['inst_work'], f"{output_dir}/{job['title']}_Inst.mp3")
+
+    # Every requested key is produced from one decode of the instrumental
+    keys = job['keys']
+    variants, missing = {0: job['inst_work']}, {}
+    for semitones in keys:
+        if semitones == 0: continue
+        variants[semitones] = os.path.join(job['workspace'], f"pitched_{semitones:+d}.wav")
+        if not cache.fetch(cache.cache_key("pitched", job.get('source_id'), stems_id, semitones), variants[semitones]):
+            missing[semitones] = variants[semitones]
+    pitch_shift(job['inst_work'], missing)
+    for semitones, path in missing.items(): cache.store(cache.cache_key("pitched", job.get('source_id'), stems_id, semitones), path)
+    job['deliveries'] = {0: job['final_inst']}  # delivered MP3 per key, reused if lyrics arrive later
+    for semitones in keys:
+        if semitones == 0: continue
+        job['deliveries'][semitones] = deliver_audio(variants[semitones], f"{output_dir}/{job['title']}_Pitched{key_suffix(semitones, keys)}.mp3")
+    pitched = [job['deliveries'][k] for k in keys if k]
+    if pitched:
+        job['final_inst'] = "; ".join(pitched)
+        print(f"      🎸 Pitched version(s) created: {job['title']} ({', '.join(f'{k:+d}' for k in keys if k)})")
+    artifacts = {'original': job['original_path'], **{f"key_{k:+d}": path for k, path in job['deliveries'].items()}}
+    checkpoints.record(job['ckpt'], "pitch", job['fp']['pitch'], artifacts, original_path=job['original_path'], final_inst=job['final_inst'])
+    checkpoints.release(job['ckpt'])
+    return variants
+
+def make_videos(cfg, job, lrc_path, audio_by_key, work_dir):
+    """Burns the lyrics onto one video per requested key; audio_by_key maps semitones -> audio file."""
+    keys, ckpt, preset, stream, ext = job['keys'], job['ckpt'], job['video_preset'], cfg['stream'], cfg['subtitle_ext']
+    video_name = lambda semitones: f"{cfg['video_dir']}/{job['title']}_Karaoke{key_suffix(semitones, keys)}.mp4"
+    subtitle_fp = checkpoints.fingerprint(checkpoints.file_fingerprint(lrc_path), ext)
+    video_fp = checkpoints.fingerprint(job['fp']['pitch'], subtitle_fp, preset, stream)
+    job['video'] = f"{job['title']}_Karaoke.mp4"
+    if checkpoints.completed(ckpt, "video", video_fp):
+        print(f"      ⏩ Video already made: {job['title']}")
+        return
+    print(f"      📺 Generating TV Video: {job['title']}")
+    done = checkpoints.completed(ckpt, "subtitle", subtitle_fp)
+    if done: subs_path = done['artifacts']['subs']
+    else:
+        subs_path = subtitles.convert(lrc_path, os.path.join(work_dir, f"subs{ext}"))
+        checkpoints.keep(ckpt, "subtitle", subtitle_fp, 'subs', subs_path)
+    videos = {}
+    if stream:
+        # The first key is encoded straight into the video folder so the TV can start on it; other keys reuse its picture
+        first = keys[0]
+        videos[first] = stream_path(video_name(first), stream)
+        print(f"      📡 Streaming to {videos[first]}")
+        stream_video(subs_path, [audio_by_key[first]], videos[first], stream, preset=preset)
+        for semitones in keys[1:]:
+            video_work = os.path.join(work_dir, f"karaoke_{semitones:+d}.mp4")
+            mux_audio(videos[first], [audio_by_key[semitones]], video_work)
+            videos[semitones] = deliver(video_work, video_name(semitones))
+    elif len(keys) == 1:
+        video_work = os.path.join(work_dir, "karaoke.mp4")
+        create_video(audio_by_key[keys[0]], subs_path, video_work, preset=preset)
+        videos[keys[0]] = deliver(video_work, video_name(keys[0]))
+    else:
+        # Same lyric picture for every key: encode it once and mux each variant onto it
+        lyric_track = os.path.join(work_dir, "lyrics_video.mp4")
+        render_lyric_track(subs_path, probe_duration(audio_by_key[0]), lyric_track, preset=preset)
+        for semitones in keys:
+            video_work = os.path.join(work_dir, f"karaoke_{semitones:+d}.mp4")
+            mux_audio(lyric_track, [audio_by_key[semitones]], video_work)
+            videos[semitones] = deliver(video_work, video_name(semitones))
+    checkpoints.record(ckpt, "video", video_fp, {f"key_{k:+d}": path for k, path in videos.items()})
+    print(f"      ✅ Video Created: {job['video']}")
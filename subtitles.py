@@ -0,0 +1,202 @@
+import hashlib
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+# --- TIMED LYRICS ---
+# One parser for plain, multi-tag ([00:10.00][01:20.00]chorus) and enhanced (<00:10.50> word)
+# LRC files, shared by the CLI, the queue worker and video_maker. A parsed file is a Timeline:
+# parallel arrays of line start/end times and offsets into a single text buffer, plus the same
+# for word timings. Timelines are memoized by file hash, so re-rendering a song for another
+# key or the full-vocal video does not parse its lyrics again.
+LAST_LINE_SECONDS = 5  # the last line has no successor to end it
+MEMO_SIZE = 256
+TIME_TAG = re.compile(r'\[(\d+):(\d+(?:[.:]\d+)?)\]')
+WORD_TAG = re.compile(r'<(\d+):(\d+(?:[.:]\d+)?)>')
+META_TAG = re.compile(r'^\[([A-Za-z#]+):(.*)\]$')
+
+# ASS look matching media.SUBTITLE_STYLE (libass' default 384x288 canvas, as SRT is rendered).
+# For \kf karaoke sweeps words start in SecondaryColour (white) and fill with PrimaryColour (yellow).
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 384
+PlayResY: 288
+WrapStyle: 0
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Noto Sans,60,&H0000FFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,3,0,2,10,10,50,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+class Timeline:
+    """Lyric lines as parallel arrays; line i's words are word_index[i]:word_index[i + 1]."""
+    __slots__ = ('starts', 'ends', 'text', 'text_offsets', 'word_index', 'word_starts', 'word_ends', 'word_text', 'word_offsets')
+
+    def __init__(self):
+        self.starts, self.ends = array('d'), array('d')
+        self.text, self.text_offsets = "", array('l', [0])
+        self.word_index = array('l', [0])
+        self.word_starts, self.word_ends = array('d'), array('d')
+        self.word_text, self.word_offsets = "", array('l', [0])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, i):
+        return self.starts[i], self.ends[i], self.text[self.text_offsets[i]:self.text_offsets[i + 1]]
+
+    def lines(self):
+        for i in range(len(self.starts)): yield self.line(i)
+
+    def words(self, i):
+        """(start, end, text) per timed word of line i; text keeps its leading space. Empty for plain LRC."""
+        wo = self.word_offsets
+        return [(self.word_starts[w], self.word_ends[w], self.word_text[wo[w]:wo[w + 1]]) for w in range(self.word_index[i], self.word_index[i + 1])]
+
+def _seconds(minutes, seconds):
+    return int(minutes) * 60 + float(seconds.replace(':', '.'))
+
+def _split_words(body, line_start):
+    """Returns (clean text, [(start, end or None, raw text)]) for one line body."""
+    parts = WORD_TAG.split(body)
+    clean = " ".join("".join(parts[0::3]).split())
+    if len(parts) == 1: return clean, []
+    words = []
+    if parts[0].strip(): words.append([line_start, None, parts[0]])
+    for k in range(1, len(parts), 3):
+        at, piece = _seconds(parts[k], parts[k + 1]), parts[k + 2]
+        if words and words[-1][1] is None: words[-1][1] = at
+        if piece.strip(): words.append([at, None, piece])
+    return clean, words
+
+def parse(text):
+    """Parses LRC text into a Timeline in one pass over the lines."""
+    offset, entries = 0.0, []
+    for raw in text.splitlines():
+        pos, starts = 0, []
+        while True:
+            m = TIME_TAG.match(raw, pos)
+            if not m: break
+            starts.append(_seconds(m.group(1), m.group(2)))
+            pos = m.end()
+        if not starts:
+            meta = META_TAG.match(raw.strip())
+            if meta and meta.group(1).lower() == "offset":
+                try: offset = int(meta.group(2).strip()) / 1000  # positive offset shows lyrics sooner
+                except ValueError: pass
+            continue
+        clean, words = _split_words(raw[pos:], starts[0])
+        for start in starts:
+            # A repeated line ([t1][t2]chorus) reuses its word timings shifted to each occurrence
+            shift = start - starts[0]
+            entries.append((start, len(entries), clean, [(ws + shift, None if we is None else we + shift, wt) for ws, we, wt in words]))
+    entries.sort()
+
+    tl = Timeline()
+    text_parts, word_parts = [], []
+    text_len = word_len = 0
+    ends, following = [0.0] * len(entries), None
+    # Each line ends where the next later line starts (blank lines included, as end markers)
+    for k in range(len(entries) - 1, -1, -1):
+        start = entries[k][0]
+        if k + 1 < len(entries) and entries[k + 1][0] > start: following = entries[k + 1][0]
+        ends[k] = following if following is not None else start + LAST_LINE_SECONDS
+    for k, (start, _, clean, words) in enumerate(entries):
+        if not clean: continue
+        start, end = max(0.0, start - offset), max(0.0, ends[k] - offset)
+        tl.starts.append(start)
+        tl.ends.append(end)
+        text_parts.append(clean)
+        text_len += len(clean)
+        tl.text_offsets.append(text_len)
+        for w, (ws, we, wt) in enumerate(words):
+            ws = max(0.0, ws - offset)
+            we = end if we is None else max(0.0, we - offset)
+            if w + 1 < len(words) and words[w + 1][0] - offset < we: we = max(ws, words[w + 1][0] - offset)
+            tl.word_starts.append(ws)
+            tl.word_ends.append(min(we, end))
+            word_parts.append(wt)
+            word_len += len(wt)
+            tl.word_offsets.append(word_len)
+        tl.word_index.append(len(tl.word_starts))
+    tl.text, tl.word_text = "".join(text_parts), "".join(word_parts)
+    return tl
+
+def shift_lrc(text, seconds):
+    """Moves every line and word time tag by seconds (clamped at zero), keeping the LRC otherwise as is."""
+    def shifted(m):
+        total = round(max(0.0, _seconds(m.group(2), m.group(3)) + seconds), 2)
+        return f"{m.group(1)}{int(total // 60):02}:{total % 60:05.2f}{m.group(4)}"
+    return re.sub(r'([\[<])(\d+):(\d+(?:[.:]\d+)?)([\]>])', shifted, text)
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+def load(path):
+    """Parses an LRC file, reusing the Timeline of any file with identical contents."""
+    with open(path, 'rb') as f: data = f.read()
+    key = hashlib.sha1(data).hexdigest()
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    tl = parse(data.decode('utf-8-sig', errors='replace'))
+    with _memo_lock:
+        _memo[key] = tl
+        while len(_memo) > MEMO_SIZE: _memo.popitem(last=False)
+    return tl
+
+# --- OUTPUT FORMATS ---
+def _clock(seconds, sep, frac_digits=3):
+    units = 10 ** frac_digits
+    total = int(round(seconds * units))
+    s, frac = divmod(total, units)
+    return f"{s // 3600:02}:{(s % 3600) // 60:02}:{s % 60:02}{sep}{frac:0{frac_digits}}"
+
+def to_srt(tl):
+    return "".join(f"{i}\n{_clock(start, ',')} --> {_clock(end, ',')}\n{text}\n\n" for i, (start, end, text) in enumerate(tl.lines(), start=1))
+
+def to_vtt(tl):
+    escape = lambda t: t.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return "WEBVTT\n\n" + "".join(f"{_clock(start, '.')} --> {_clock(end, '.')}\n{escape(text)}\n\n" for start, end, text in tl.lines())
+
+def _ass_time(seconds):
+    return _clock(seconds, '.', 2)[1:]  # H:MM:SS.cc
+
+def _ass_text(text):
+    return text.replace("\\", "＼").replace("{", "(").replace("}", ")")  # ASS has no escapes for these
+
+def _karaoke_text(tl, i, line_start):
+    """Builds '{\\kf<cs>}word' runs for line i; timings are rounded on the running total so they never drift."""
+    cs = lambda t: int(round((t - line_start) * 100))
+    runs, cursor = [], 0
+    for start, end, word in tl.words(i):
+        gap = cs(start) - cursor
+        if gap > 0: runs.append(f"{{\\k{gap}}}")
+        duration = max(0, cs(end) - max(cursor, cs(start)))
+        runs.append(f"{{\\kf{duration}}}{_ass_text(word if runs else word.lstrip())}")
+        cursor = max(cursor, cs(start)) + duration
+    return "".join(runs).strip()
+
+def to_ass(tl, karaoke=True):
+    """ASS events for every line; lines with enhanced word timings get \\kf word sweeps when karaoke is on."""
+    events = []
+    for i, (start, end, text) in enumerate(tl.lines()):
+        body = _karaoke_text(tl, i, start) if karaoke and tl.word_index[i + 1] > tl.word_index[i] else _ass_text(text)
+        events.append(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{body}")
+    return ASS_HEADER + "\n".join(events) + "\n"
+
+WRITERS = {".srt": to_srt, ".vtt": to_vtt, ".ass": to_ass}
+
+def write(tl, path):
+    """Writes the timeline in the format given by path's extension (.srt, .vtt or .ass)."""
+    with open(path, 'w', encoding='utf-8') as f: f.write(WRITERS[os.path.splitext(path)[1].lower()](tl))
+    return path
+
+def convert(lrc_path, out_path):
+    return write(load(lrc_path), out_path)
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- STAGE SPANS ---
+# One JSON line per (track, stage): wall time, CPU time, peak memory and bytes read/written.
+# cpu_seconds is the stage thread plus the ffmpeg children it ran (exact); process_cpu_seconds
+# also includes ONNX worker threads, but overlaps with whatever other stages ran concurrently.
+# Memory is sampled while the span is open: rss_peak_mb is the highest process RSS seen during
+# the span and rss_delta_mb how far it rose above the RSS at the start (the stage's own growth,
+# plus whatever concurrent stages allocated meanwhile).
+SPANS_FILE = os.environ.get("KARAOKE_SPANS") or None
+RUN_ID = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+RSS_SAMPLE_SECONDS = 0.1
+_write_lock = threading.Lock()
+_local = threading.local()
+_rss_lock = threading.Lock()
+_rss_open = {}  # id(record) -> [start MB, peak MB] for every open span in any thread
+_rss_sampler = None
+
+def configure(path):
+    """Sets the default spans file; the KARAOKE_SPANS environment variable wins."""
+    global SPANS_FILE
+    if not os.environ.get("KARAOKE_SPANS"): SPANS_FILE = path
+
+def _stack():
+    if not hasattr(_local, 'spans'): _local.spans = []
+    return _local.spans
+
+def _rss_mb():
+    """Current resident set size; the peak since process start where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KiB
+
+def _sample_rss():
+    while True:
+        time.sleep(RSS_SAMPLE_SECONDS)
+        rss = _rss_mb()
+        with _rss_lock:
+            for box in _rss_open.values(): box[1] = max(box[1], rss)
+
+def _rss_start(rec):
+    global _rss_sampler
+    rss = _rss_mb()
+    with _rss_lock:
+        _rss_open[id(rec)] = [rss, rss]
+        if _rss_sampler is None:
+            _rss_sampler = threading.Thread(target=_sample_rss, daemon=True, name="telemetry-rss")
+            _rss_sampler.start()
+
+def _rss_stop(rec):
+    """(start, peak) in MB, including a last sample so spans shorter than the interval still count."""
+    rss = _rss_mb()
+    with _rss_lock: start, peak = _rss_open.pop(id(rec))
+    return start, max(peak, rss)
+
+@contextmanager
+def span(stage, track=None, **attrs):
+    """Times the enclosed block; yields the record so callers can add fields (track, audio_seconds, ...)."""
+    rec = {'run': RUN_ID, 'ts': time.time(), 'stage': stage, 'track': track, 'bytes_in': 0, 'bytes_out': 0, 'child_cpu_seconds': 0.0, 'child_rss_peak_mb': 0.0, **attrs}
+    wall, cpu, proc_cpu = time.perf_counter(), time.thread_time(), time.process_time()
+    _stack().append(rec)
+    _rss_start(rec)
+    try:
+        yield rec
+    except Exception as e:
+        rec['error'] = str(e)
+        raise
+    finally:
+        _stack().pop()
+        rss_start, rss_peak = _rss_stop(rec)
+        rec['wall_seconds'] = round(time.perf_counter() - wall, 3)
+        rec['cpu_seconds'] = round(time.thread_time() - cpu + rec['child_cpu_seconds'], 3)
+        rec['process_cpu_seconds'] = round(time.process_time() - proc_cpu, 3)
+        rec['rss_peak_mb'], rec['rss_delta_mb'] = round(rss_peak, 1), round(rss_peak - rss_start, 1)
+        if rec.get('audio_seconds') and rec['wall_seconds']: rec['realtime_factor'] = round(rec['audio_seconds'] / rec['wall_seconds'], 2)
+        _write(rec)
+
+def note(**fields):
+    """Adds fields to the innermost open span of this thread (no-op outside a span)."""
+    if _stack(): _stack()[-1].update(fields)
+
+def add_io(inputs=(), outputs=()):
+    """Credits the sizes of files read and written to every open span of this thread."""
+    if not _stack(): return
+    bytes_in = sum(os.path.getsize(p) for p in inputs if p and os.path.isfile(p))
+    bytes_out = sum(os.path.getsize(p) for p in outputs if p and os.path.isfile(p))
+    for rec in _stack():
+        rec['bytes_in'] += bytes_in
+        rec['bytes_out'] += bytes_out
+
+def run(cmd, check=False, **kwargs):
+    """subprocess.run for ffmpeg calls that credits the child's CPU time and peak RSS to the open spans."""
+    proc = subprocess.Popen(cmd, **kwargs)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    for rec in _stack():
+        rec['child_cpu_seconds'] += usage.ru_utime + usage.ru_stime
+        rec['child_rss_peak_mb'] = max(rec['child_rss_peak_mb'], round(usage.ru_maxrss / 1024, 1))
+    if check and proc.returncode: raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return proc
+
+def _write(rec):
+    if not SPANS_FILE: return
+    line = json.dumps({k: round(v, 3) if isinstance(v, float) else v for k, v in rec.items()}, ensure_ascii=False)
+    with _write_lock:
+        os.makedirs(os.path.dirname(SPANS_FILE) or ".", exist_ok=True)
+        with open(SPANS_FILE, 'a', encoding='utf-8') as f: f.write(line + "\n")
+
+# --- SUMMARY ---
+METRICS = ["wall_seconds", "cpu_seconds", "rss_peak_mb", "rss_delta_mb", "child_rss_peak_mb", "bytes_in", "bytes_out", "realtime_factor"]
+
+def load_spans(path):
+    spans = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try: spans.append(json.loads(line))
+            except ValueError: continue  # a run killed mid-write leaves a partial last line
+    return spans
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values: return None
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def summarize(spans):
+    """Returns {stage: {'count', 'errors', metric: {'p50', 'p95', 'sum'}}} across every run in spans."""
+    stages = {}
+    for rec in spans:
+        stages.setdefault(rec['stage'], []).append(rec)
+    summary = {}
+    for stage, recs in stages.items():
+        row = {'count': len(recs), 'errors': sum(1 for r in recs if r.get('error'))}
+        for metric in METRICS:
+            values = [r[metric] for r in recs if isinstance(r.get(metric), (int, float))]
+            if values: row[metric] = {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'sum': sum(values)}
+        summary[stage] = row
+    return summary
+
+def print_summary(summary):
+    print(f"{'stage':<12}{'n':>6}{'err':>5}{'wall p50':>10}{'wall p95':>10}{'cpu p50':>9}{'rss p95':>9}{'rss +p95':>9}{'MB in':>9}{'MB out':>9}{'rtf p50':>9}")
+    for stage, row in sorted(summary.items(), key=lambda kv: -kv[1].get('wall_seconds', {}).get('sum', 0)):
+        get = lambda m, q: row.get(m, {}).get(q)
+        fmt = lambda v, spec: format(v, spec) if v is not None else "-".rjust(int(spec.split('.')[0]))
+        mb = lambda v: v / 1e6 if v is not None else None
+        print(f"{stage:<12}{row['count']:>6}{row['errors']:>5}{fmt(get('wall_seconds', 'p50'), '10.1f')}{fmt(get('wall_seconds', 'p95'), '10.1f')}"
+              f"{fmt(get('cpu_seconds', 'p50'), '9.1f')}{fmt(get('rss_peak_mb', 'p95'), '9.0f')}{fmt(get('rss_delta_mb', 'p95'), '9.0f')}{fmt(mb(get('bytes_in', 'sum')), '9.0f')}"
+              f"{fmt(mb(get('bytes_out', 'sum')), '9.0f')}{fmt(get('realtime_factor', 'p50'), '9.1f')}")
+
+def prometheus_text(summary):
+    """Renders the summary as Prometheus text exposition (summary-type metrics with p50/p95 quantiles)."""
+    lines = []
+    for metric in METRICS:
+        name = f"karaoke_stage_{metric}"
+        lines += [f"# HELP {name} Per-track stage {metric.replace('_', ' ')} from the spans file.", f"# TYPE {name} summary"]
+        for stage, row in sorted(summary.items()):
+            if metric not in row: continue
+            for q, label in (("p50", "0.5"), ("p95", "0.95")): lines.append(f'{name}{{stage="{stage}",quantile="{label}"}} {row[metric][q]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {row[metric]["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {row["count"]}')
+    lines += ["# HELP karaoke_stage_errors_total Stage spans that ended in an error.", "# TYPE karaoke_stage_errors_total counter"]
+    lines += [f'karaoke_stage_errors_total{{stage="{stage}"}} {row["errors"]}' for stage, row in sorted(summary.items())]
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate stage spans (p50/p95 per stage across runs).")
+    parser.add_argument("command", choices=["summary"])
+    parser.add_argument("spans", nargs="?", default=SPANS_FILE, help="spans JSONL file (default: $KARAOKE_SPANS)")
+    parser.add_argument("--run", help="only include this run id")
+    parser.add_argument("--prometheus", metavar="FILE", help="also write Prometheus text format to FILE ('-' for stdout)")
+    args = parser.parse_args()
+    if not args.spans or not os.path.exists(args.spans):
+        print("❌ No spans file found (pass a path or set KARAOKE_SPANS).")
+        return
+    spans = [s for s in load_spans(args.spans) if not args.run or s.get('run') == args.run]
+    summary = summarize(spans)
+    print(f"📊 {len(spans)} spans from {len({s.get('run') for s in spans})} run(s)")
+    print_summary(summary)
+    if args.prometheus == "-": print(prometheus_text(summary), end="")
+    elif args.prometheus:
+        with open(args.prometheus, 'w', encoding='utf-8') as f: f.write(prometheus_text(summary))
+        print(f"📄 Prometheus metrics written to {args.prometheus}")
+
+if __name__ == "__main__": main()
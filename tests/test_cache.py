@@ -0,0 +1,59 @@
+import os
+import pytest
+import cache
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache, "CACHE_MAX_BYTES", 1 << 30)
+
+def artifact(tmp_path, name, size=100):
+    path = tmp_path / "work" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(name.encode("utf-8").ljust(size, b"\0"))
+    return str(path)
+
+def entry(key, ext=".wav"):
+    return cache._entry_path(key, ext)
+
+def test_store_and_fetch_hard_link_the_entry(tmp_path):
+    src = artifact(tmp_path, "inst.wav")
+    cache.store("k1", src)
+    assert os.path.samefile(src, entry("k1"))
+    dest = str(tmp_path / "out.wav")
+    assert cache.fetch("k1", dest)
+    assert os.path.samefile(dest, entry("k1"))
+
+def test_link_falls_back_to_a_copy(tmp_path, monkeypatch):
+    def cross_device(src, dest): raise OSError(18, "Invalid cross-device link")
+    monkeypatch.setattr(cache.os, "link", cross_device)
+    src = artifact(tmp_path, "inst.wav")
+    cache.store("k1", src)
+    dest = str(tmp_path / "out.wav")
+    assert cache.fetch("k1", dest)
+    assert not os.path.samefile(dest, entry("k1"))
+    with open(src, 'rb') as a, open(dest, 'rb') as b: assert a.read() == b.read()
+
+def test_miss_and_missing_key():
+    assert not cache.fetch("absent", "/nonexistent/out.wav")
+    assert not cache.fetch(None, "/nonexistent/out.wav")
+    assert cache.cache_key("inst", None, "model") is None
+
+def test_evicts_least_recently_used_past_the_cap(tmp_path, monkeypatch):
+    for i, key in enumerate(("old", "mid", "new")):
+        cache.store(key, artifact(tmp_path, f"{key}.wav"))
+        os.utime(entry(key), (1000 + i, 1000 + i))
+    # A fetch refreshes the entry's mtime, so "old" is now the most recently used
+    assert cache.fetch("old", str(tmp_path / "played.wav"))
+
+    monkeypatch.setattr(cache, "CACHE_MAX_BYTES", 250)
+    cache.store("newest", artifact(tmp_path, "newest.wav"))
+    assert [os.path.exists(entry(k)) for k in ("mid", "new", "old", "newest")] == [False, False, True, True]
+
+def test_linked_outputs_survive_eviction(tmp_path):
+    cache.store("k1", artifact(tmp_path, "inst.wav"))
+    dest = str(tmp_path / "out.wav")
+    assert cache.fetch("k1", dest)
+    cache.evict(max_bytes=0)
+    assert not os.path.exists(entry("k1"))
+    with open(dest, 'rb') as f: assert f.read().startswith(b"inst.wav")
@@ -0,0 +1,82 @@
+import os
+import pytest
+import catalog
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_DB", str(tmp_path / "catalog.sqlite"))
+    root = tmp_path / "KaraokeOutput"
+    (root / "Karaoke_Videos_Final").mkdir(parents=True)
+    monkeypatch.setattr(catalog, "LIBRARY", None)
+    catalog.configure(str(root))
+    return root
+
+def touch(root, rel, data=b"x"):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+def test_single_key_pitched_job_yields_one_instrumental_per_video(library):
+    # --keys 4 delivers both files with no key suffix; only one of them may own Song_Karaoke.mp4
+    for name in ("Song.lrc", "Song_Inst.mp3", "Song_Pitched.mp3", "Song_Original.mp3"): touch(library, name)
+    catalog.scan()
+    chosen = catalog.instrumentals(catalog.artifacts().values())
+    assert [row['path'] for row in chosen] == ["Song_Pitched.mp3"]
+    assert [row['path'] for row in catalog.missing()] == ["Song_Pitched.mp3"]
+
+def test_multi_key_job_keeps_every_key(library):
+    for name in ("Song.lrc", "Song_Inst.mp3", "Song_Pitched_+4.mp3", "Song_Pitched_-4.mp3"): touch(library, name)
+    catalog.scan()
+    chosen = catalog.instrumentals(catalog.artifacts().values())
+    assert sorted(row['path'] for row in chosen) == ["Song_Inst.mp3", "Song_Pitched_+4.mp3", "Song_Pitched_-4.mp3"]
+
+def test_classify():
+    assert catalog.classify("Song_Inst.mp3") == ("inst", "Song", "")
+    assert catalog.classify("Song_Pitched.mp3") == ("pitched", "Song", "")
+    assert catalog.classify("Song_Pitched_-2.mp3") == ("pitched", "Song", "_-2")
+    assert catalog.classify("Song_Karaoke_+4.m3u8") == ("karaoke", "Song", "_+4")
+    assert catalog.classify("Song_FullVocals.mp4") == ("full", "Song", "")
+    assert catalog.classify("Song.lrc") == ("lyrics", "Song", "")
+    assert catalog.classify("Report_Video.csv") is None
+
+def test_scan_indexes_new_files_and_drops_vanished_ones(library):
+    touch(library, "Song.lrc")
+    touch(library, "Song_Inst.mp3")
+    touch(library, "Karaoke_Videos_Final/Song_Karaoke.mp4")
+    touch(library, ".checkpoints/abc/inst.wav")
+    touch(library, "notes.txt")
+    assert catalog.scan() == (3, 0)
+    rows = catalog.artifacts()
+    assert sorted(rows) == ["Karaoke_Videos_Final/Song_Karaoke.mp4", "Song.lrc", "Song_Inst.mp3"]
+    assert rows["Karaoke_Videos_Final/Song_Karaoke.mp4"]['folder'] == "Karaoke_Videos_Final"
+    assert catalog.scan() == (0, 0)
+
+    os.remove(library / "Song_Inst.mp3")
+    touch(library, "Other_Inst.mp3")
+    assert catalog.scan() == (1, 1)
+    assert sorted(catalog.artifacts(kinds=["inst"])) == ["Other_Inst.mp3"]
+
+def test_refresh_picks_up_edits_the_scan_cannot_see(library):
+    lrc = touch(library, "Song.lrc", b"[00:01.00]old")
+    catalog.scan()
+    stat = os.stat(lrc)
+    with open(lrc, 'wb') as f: f.write(b"[00:01.00]new lyrics")  # rewritten in place: the folder mtime does not move
+    assert catalog.scan() == (0, 0)
+    assert catalog.artifacts()["Song.lrc"]['size'] == stat.st_size
+
+    rows = catalog.refresh([lrc, str(library / "Song_Inst.mp3")])
+    assert list(rows) == ["Song.lrc"]
+    assert rows["Song.lrc"]['size'] == len(b"[00:01.00]new lyrics")
+    assert catalog.artifacts()["Song.lrc"]['size'] == len(b"[00:01.00]new lyrics")
+
+    os.remove(lrc)
+    assert catalog.refresh([lrc]) == {}
+    assert "Song.lrc" not in catalog.artifacts()
+
+def test_missing_lists_instrumentals_with_lyrics_but_no_video(library):
+    for name in ("Song.lrc", "Song_Inst.mp3", "Song_Pitched_+4.mp3", "Done.lrc", "Done_Inst.mp3", "NoLyrics_Inst.mp3",
+                 "Karaoke_Videos_Final/Song_Karaoke.mp4", "Karaoke_Videos_Final/Done_Karaoke.mp4"):
+        touch(library, name)
+    catalog.scan()
+    assert [row['path'] for row in catalog.missing()] == ["Song_Pitched_+4.mp3"]
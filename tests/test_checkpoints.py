@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import pytest
+import checkpoints
+import workspace
+
+@pytest.fixture(autouse=True)
+def writeback(tmp_path, monkeypatch):
+    """Forces every deliver() through a fresh upload pool whose staging folder lives in tmp_path."""
+    monkeypatch.setattr(workspace, "SCRATCH_ROOT", str(tmp_path / "scratch"))
+    monkeypatch.setattr(workspace, "WRITEBACK_WORKERS", 1)
+    monkeypatch.setattr(workspace, "_same_filesystem", lambda src, dest_dir: False)
+    monkeypatch.setattr(workspace, "_uploader", None)
+    monkeypatch.setattr(workspace, "_staging", None)
+    yield
+    workspace.flush()
+    if workspace._uploader: workspace._uploader.shutdown()
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Holds uploads until the test sets the returned event."""
+    event, copy = threading.Event(), workspace._copy_verified
+    def held(staged, dest):
+        assert event.wait(5)
+        copy(staged, dest)
+    monkeypatch.setattr(workspace, "_copy_verified", held)
+    return event
+
+def intermediate(tmp_path, name, data=b"RIFF-wav"):
+    path = tmp_path / "work" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+def saved_stages(ckpt):
+    with open(os.path.join(ckpt['dir'], checkpoints.STATE_FILE), encoding='utf-8') as f: return json.load(f)['stages']
+
+def test_stage_is_recorded_only_after_its_upload_lands(tmp_path, gate):
+    ckpt = checkpoints.open_track(str(tmp_path / "ckpt"), "https://example.com/a")
+    checkpoints.keep(ckpt, "separate", "fp1", "inst", intermediate(tmp_path, "instrumental.wav"))
+    assert checkpoints.completed(ckpt, "separate", "fp1") is None
+    assert not os.path.exists(os.path.join(ckpt['dir'], checkpoints.STATE_FILE))
+
+    gate.set()
+    assert workspace.flush() == []
+    rec = checkpoints.completed(ckpt, "separate", "fp1")
+    assert rec['artifacts'] == {'inst': os.path.join(ckpt['dir'], "inst.wav")}
+    with open(rec['artifacts']['inst'], 'rb') as f: assert f.read() == b"RIFF-wav"
+    assert "separate" in saved_stages(ckpt)
+
+def test_changed_fingerprint_invalidates_the_stages_after_it(tmp_path):
+    # Stages chain their fingerprints the way stages.download_track does
+    def chain(stems_id):
+        fp = {'download': checkpoints.fingerprint("https://example.com/a")}
+        fp['separate'] = checkpoints.fingerprint(fp['download'], stems_id)
+        fp['pitch'] = checkpoints.fingerprint(fp['separate'], [0, 4])
+        return fp
+
+    root, fp = str(tmp_path / "ckpt"), chain("model-a")
+    ckpt = checkpoints.open_track(root, "https://example.com/a")
+    for stage in ("download", "separate", "pitch"): checkpoints.record(ckpt, stage, fp[stage])
+
+    resumed, fp = checkpoints.open_track(root, "https://example.com/a"), chain("model-b")
+    assert checkpoints.completed(resumed, "download", fp['download'])
+    assert checkpoints.completed(resumed, "separate", fp['separate']) is None
+    assert checkpoints.completed(resumed, "pitch", fp['pitch']) is None
+
+def test_missing_artifact_invalidates_the_stage(tmp_path):
+    ckpt = checkpoints.open_track(str(tmp_path / "ckpt"), "https://example.com/a")
+    checkpoints.keep(ckpt, "download", "fp1", "audio", intermediate(tmp_path, "source.mp3"))
+    workspace.flush()
+    assert checkpoints.completed(ckpt, "download", "fp1")
+    os.remove(os.path.join(ckpt['dir'], "audio.mp3"))
+    assert checkpoints.completed(ckpt, "download", "fp1") is None
+    assert checkpoints.completed(ckpt, "download", "fp1", artifacts=False)
+
+def test_release_deletes_kept_files_but_keeps_the_records(tmp_path):
+    ckpt = checkpoints.open_track(str(tmp_path / "ckpt"), "https://example.com/a")
+    checkpoints.keep(ckpt, "separate", "fp1", "inst", intermediate(tmp_path, "instrumental.wav"))
+    workspace.flush()
+    checkpoints.release(ckpt)
+    assert os.listdir(ckpt['dir']) == [checkpoints.STATE_FILE]
+    assert "separate" in saved_stages(ckpt)
+
+def test_release_deletes_a_copy_still_uploading_once_it_lands(tmp_path, gate):
+    ckpt = checkpoints.open_track(str(tmp_path / "ckpt"), "https://example.com/a")
+    checkpoints.keep(ckpt, "separate", "fp1", "inst", intermediate(tmp_path, "instrumental.wav"))
+    checkpoints.release(ckpt)
+    gate.set()
+    assert workspace.flush() == []
+    assert os.listdir(ckpt['dir']) == [checkpoints.STATE_FILE]
+    assert "separate" in saved_stages(ckpt)
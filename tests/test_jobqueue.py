@@ -0,0 +1,106 @@
+import time
+import pytest
+import jobqueue
+
+SETTINGS = {'keys': [0], 'make_video': True, 'video_preset': "static_1080p"}
+
+@pytest.fixture(autouse=True)
+def queue_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobqueue, "QUEUE_DB", str(tmp_path / "jobs.sqlite"))
+
+def job(job_id):
+    return next(j for j in jobqueue.list_jobs() if j['id'] == job_id)
+
+def test_enqueue_reuses_identical_active_job():
+    first = jobqueue.enqueue("https://a", SETTINGS)
+    assert jobqueue.enqueue("https://a", dict(reversed(list(SETTINGS.items())))) == first
+    assert jobqueue.enqueue("https://a", {**SETTINGS, 'keys': [4]}) != first
+    jobqueue.claim()
+    assert jobqueue.enqueue("https://a", SETTINGS) == first  # running counts as active
+    jobqueue.finish(first, "done", "ok")
+    assert jobqueue.enqueue("https://a", SETTINGS) != first
+
+def test_enqueue_rejects_a_full_queue(monkeypatch):
+    monkeypatch.setattr(jobqueue, "MAX_ACTIVE_JOBS", 2)
+    jobqueue.enqueue("https://a", SETTINGS)
+    jobqueue.enqueue("https://b", SETTINGS)
+    with pytest.raises(jobqueue.QueueFull):
+        jobqueue.enqueue("https://c", SETTINGS)
+
+def test_claim_takes_oldest_queued_job():
+    first, second = jobqueue.enqueue("https://a", SETTINGS), jobqueue.enqueue("https://b", SETTINGS)
+    claimed = jobqueue.claim()
+    assert (claimed['id'], claimed['state'], claimed['attempts'], claimed['settings']) == (first, "running", 1, SETTINGS)
+    assert job(first)['state'] == "running" and job(first)['attempts'] == 1
+    assert jobqueue.claim()['id'] == second
+    assert jobqueue.claim() is None
+
+def test_fail_requeues_until_attempts_run_out():
+    job_id = jobqueue.enqueue("https://a", SETTINGS)
+    for attempt in range(1, jobqueue.MAX_ATTEMPTS):
+        assert jobqueue.claim()['attempts'] == attempt
+        assert jobqueue.fail(job_id, "boom") == "queued"
+    jobqueue.claim()
+    assert jobqueue.fail(job_id, "boom") == "failed"
+    assert job(job_id)['message'] == f"boom (attempt {jobqueue.MAX_ATTEMPTS}/{jobqueue.MAX_ATTEMPTS})"
+    assert jobqueue.claim() is None
+
+def test_recover_requeues_interrupted_jobs():
+    job_id = jobqueue.enqueue("https://a", SETTINGS)
+    jobqueue.claim()
+    jobqueue.heartbeat(1234)
+    assert jobqueue.recover() == 1
+    assert job(job_id)['state'] == "queued"
+    assert not jobqueue.worker_alive()
+    assert jobqueue.claim()['attempts'] == 2
+
+def test_recover_fails_a_job_that_keeps_killing_the_worker():
+    job_id = jobqueue.enqueue("https://a", SETTINGS)
+    for _ in range(jobqueue.MAX_ATTEMPTS - 1):
+        jobqueue.claim()
+        assert jobqueue.recover() == 1
+    jobqueue.claim()
+    assert jobqueue.recover() == 0
+    assert job(job_id)['state'] == "failed"
+    assert jobqueue.claim() is None
+
+def test_cancel_queued_job_at_once_and_running_job_cooperatively():
+    running, queued = jobqueue.enqueue("https://a", SETTINGS), jobqueue.enqueue("https://b", SETTINGS)
+    jobqueue.claim()
+    jobqueue.request_cancel(queued)
+    jobqueue.request_cancel(running)
+    assert job(queued)['state'] == "cancelled"
+    assert job(running)['state'] == "running" and jobqueue.cancel_requested(running)
+    jobqueue.finish(running, "cancelled", "Cancelled after 0/1 tracks processed")
+    assert job(running)['state'] == "cancelled"
+
+def test_retry_resets_failed_and_cancelled_jobs_only():
+    failed, cancelled, queued = (jobqueue.enqueue(f"https://{n}", SETTINGS) for n in "abc")
+    jobqueue.finish(failed, "failed", "x")
+    jobqueue.request_cancel(cancelled)
+    for job_id in (failed, cancelled, queued): jobqueue.retry(job_id)
+    assert [(job(j)['state'], job(j)['attempts'], job(j)['message']) for j in (failed, cancelled)] == [("queued", 0, "Retry queued")] * 2
+    assert job(queued)['message'] == ""
+
+def test_finished_tracks_are_skipped_on_resume():
+    job_id = jobqueue.enqueue("https://a", SETTINGS)
+    jobqueue.record_track(job_id, 0, "One", "done")
+    jobqueue.record_track(job_id, 1, "Two", "failed", "boom")
+    jobqueue.record_track(job_id, 2, "Three", "done")
+    jobqueue.record_track(job_id, 1, "Two", "done")  # a retry overwrites the failure
+    assert jobqueue.finished_tracks(job_id) == {0, 1, 2}
+    assert [t['title'] for t in jobqueue.job_tracks(job_id)] == ["One", "Two", "Three"]
+
+def test_finish_done_completes_progress():
+    job_id = jobqueue.enqueue("https://a", SETTINGS)
+    jobqueue.update_progress(job_id, 0.5, "half")
+    assert job(job_id)['progress'] == 0.5
+    jobqueue.finish(job_id, "done", "2/2 tracks processed")
+    assert (job(job_id)['state'], job(job_id)['progress']) == ("done", 1)
+
+def test_worker_alive_follows_heartbeats(monkeypatch):
+    assert not jobqueue.worker_alive()
+    jobqueue.heartbeat(1234)
+    assert jobqueue.worker_alive()
+    monkeypatch.setattr(time, "time", lambda now=time.time(): now + jobqueue.HEARTBEAT_TIMEOUT + 1)
+    assert not jobqueue.worker_alive()
@@ -0,0 +1,70 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("syncedlyrics")
+import lyrics
+
+SYNCED = "[00:01.00]Hello\n[00:02.00]World\n"
+PLAIN = "Hello\nWorld\n"
+
+@pytest.fixture(autouse=True)
+def lyrics_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(lyrics, "LYRICS_CACHE_DIR", str(tmp_path / "lyrics"))
+
+def counting(result):
+    """A provider that returns result (or raises it) and counts its calls."""
+    def provider(query):
+        provider.calls += 1
+        if isinstance(result, Exception): raise result
+        return result
+    provider.calls = 0
+    return provider
+
+def test_cache_hit_skips_the_providers():
+    first = counting(SYNCED)
+    assert lyrics.find_lyrics("Song (Official Video)", providers={"a": first}) == SYNCED
+    second = counting(None)
+    # Same normalized title, so it is answered from the cache
+    assert lyrics.find_lyrics("song", providers={"a": second}) == SYNCED
+    assert (first.calls, second.calls) == (1, 0)
+
+def test_miss_is_cached_until_the_negative_ttl_expires(monkeypatch):
+    miss = counting(None)
+    assert lyrics.find_lyrics("Song", providers={"a": miss}) is None
+    assert lyrics.find_lyrics("Song", providers={"a": miss}) is None
+    assert miss.calls == 1
+
+    later = time.time() + lyrics.NEGATIVE_TTL + 1
+    monkeypatch.setattr(lyrics.time, "time", lambda: later)
+    found = counting(SYNCED)
+    assert lyrics.find_lyrics("Song", providers={"a": found}) == SYNCED
+    assert found.calls == 1
+
+def test_slow_provider_does_not_block_past_the_deadline():
+    release = threading.Event()
+    def slow(query):
+        release.wait(5)
+        return SYNCED
+    try:
+        start = time.monotonic()
+        provider, lrc, answered = lyrics.search_providers("Song", {"slow": slow, "empty": lambda q: None}, timeout=0.2)
+        assert time.monotonic() - start < 1
+        assert (provider, lrc, answered) == (None, None, True)
+    finally:
+        release.set()
+
+def test_first_synced_result_wins_over_plain_text():
+    def late_synced(query):
+        time.sleep(0.1)
+        return SYNCED
+    provider, lrc, answered = lyrics.search_providers("Song", {"plain": lambda q: PLAIN, "synced": late_synced}, timeout=5)
+    assert (provider, lrc, answered) == ("synced", SYNCED, True)
+
+def test_every_provider_failing_is_not_cached_as_a_miss():
+    broken = counting(ConnectionError("offline"))
+    assert lyrics.find_lyrics("Song", providers={"a": broken, "b": broken}) is None
+    assert lyrics.cached_lyrics("Song") == (False, None)
+    found = counting(SYNCED)
+    assert lyrics.find_lyrics("Song", providers={"a": found}) == SYNCED
+    assert found.calls == 1
@@ -0,0 +1,37 @@
+import threading
+import pytest
+from pipeline import run_pipeline
+
+def double(job):
+    job['value'] *= 2
+
+def test_jobs_flow_through_every_stage():
+    stages = [("double", double, 2), ("again", double, 1)]
+    out = list(run_pipeline(({'value': i} for i in range(5)), stages))
+    assert sorted(job['value'] for job in out) == [0, 4, 8, 12, 16]
+
+def test_stage_errors_stay_on_the_job():
+    def boom(job):
+        if job['value'] == 1: raise ValueError("bad track")
+    out = {job['value']: job for job in run_pipeline(({'value': i} for i in range(3)), [("boom", boom, 1)])}
+    assert out[1]['error'] == "boom: bad track"
+    assert 'error' not in out[0] and 'error' not in out[2]
+
+def test_failing_feed_drains_and_reraises():
+    def feed():
+        yield {'value': 1}
+        yield {'value': 2}
+        raise RuntimeError("database is locked")
+
+    seen, result = [], {}
+    def consume():
+        try:
+            for job in run_pipeline(feed(), [("double", double, 2), ("again", double, 1)]): seen.append(job['value'])
+        except RuntimeError as e:
+            result['error'] = e
+    t = threading.Thread(target=consume, daemon=True)
+    t.start()
+    t.join(timeout=5)
+    assert not t.is_alive(), "pipeline hung after the feed failed"
+    assert sorted(seen) == [4, 8]
+    assert str(result['error']) == "database is locked"
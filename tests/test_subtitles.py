@@ -0,0 +1,157 @@
+import re
+from datetime import timedelta
+import pytest
+import subtitles
+
+# lrc_to_srt as it was copied in cli.py / worker.py / video_maker.py before the subtitles module
+def legacy_lrc_to_srt(lrc_path, srt_path):
+    with open(lrc_path, 'r', encoding='utf-8') as f: lines = f.readlines()
+    srt_lines = []
+    counter = 1
+    pattern = re.compile(r'\[(\d+):(\d+\.?\d*)\](.*)')
+    parsed_lines = []
+    for line in lines:
+        match = pattern.match(line)
+        if match:
+            minutes = int(match.group(1))
+            seconds = float(match.group(2))
+            clean_text = re.sub(r'<[^>]+>', '', match.group(3).strip()).strip()
+            start_time = timedelta(minutes=minutes, seconds=seconds)
+            parsed_lines.append((start_time, clean_text))
+
+    for i in range(len(parsed_lines)):
+        start = parsed_lines[i][0]
+        text = parsed_lines[i][1]
+        end = parsed_lines[i+1][0] if i < len(parsed_lines) - 1 else start + timedelta(seconds=5)
+        def fmt_time(td):
+            total_sec = int(td.total_seconds())
+            ms = int(td.microseconds / 1000)
+            return f"{total_sec // 3600:02}:{(total_sec % 3600) // 60:02}:{total_sec % 60:02},{ms:03}"
+        if text:
+            srt_lines.append(f"{counter}\n{fmt_time(start)} --> {fmt_time(end)}\n{text}\n\n")
+            counter += 1
+    with open(srt_path, 'w', encoding='utf-8') as f: f.writelines(srt_lines)
+
+def legacy(tmp_path, lrc):
+    (tmp_path / "in.lrc").write_text(lrc, encoding="utf-8")
+    legacy_lrc_to_srt(tmp_path / "in.lrc", tmp_path / "legacy.srt")
+    return (tmp_path / "legacy.srt").read_text(encoding="utf-8")
+
+def new(tmp_path, lrc):
+    (tmp_path / "in.lrc").write_text(lrc, encoding="utf-8")
+    subtitles._memo.clear()
+    return open(subtitles.convert(str(tmp_path / "in.lrc"), str(tmp_path / "new.srt")), encoding="utf-8").read()
+
+PLAIN = """[ar:Someone]
+[ti:Some Song]
+[00:01.00]First line
+[00:03.50]Second line
+[00:07.25]
+[00:09.10]After a pause
+[01:02.75]Past a minute
+[59:59.99]Last line
+"""
+
+@pytest.mark.parametrize("lrc", [
+    PLAIN,
+    "[00:01.00]Only line\n",
+    "[00:00.00]Start at zero\n[00:02.00]\n[00:02.50]Blank end marker above\n[00:04.00]\n",
+    "[00:01]No fraction\n[00:02.5]One digit\n[00:03.123]Three digits\n",
+    "\ufeff[00:01.00]Byte order mark\r\n[00:02.00]Windows line ends\r\n",
+])
+def test_plain_lrc_matches_legacy(tmp_path, lrc):
+    assert new(tmp_path, lrc) == legacy(tmp_path, lrc.lstrip("\ufeff"))
+
+def test_blank_lines_end_the_previous_line(tmp_path):
+    srt = new(tmp_path, "[00:01.00]Sung\n[00:02.00]\n[00:10.00]Next\n")
+    assert "00:00:01,000 --> 00:00:02,000\nSung" in srt
+    assert srt.count(" --> ") == 2
+
+def test_multi_tag_line_matches_legacy_on_expanded_lines(tmp_path):
+    lrc = "[00:01.00]Verse\n[00:05.00][00:20.00]Chorus\n[00:10.00]Bridge\n[00:25.00]\n"
+    # The old parser kept the second tag in the text; one line per tag is what it was meant to show
+    expanded = "[00:01.00]Verse\n[00:05.00]Chorus\n[00:10.00]Bridge\n[00:20.00]Chorus\n[00:25.00]\n"
+    assert "[00:20.00]" in legacy(tmp_path, lrc)
+    assert new(tmp_path, lrc) == legacy(tmp_path, expanded)
+
+def test_enhanced_word_tags_match_legacy_text(tmp_path):
+    lrc = "[00:01.00]<00:01.00>Hello <00:01.50>big <00:02.50>world<00:03.00>\n[00:04.00]<00:04.00>Next <00:04.40> line\n"
+    # Same cues; only the double space left where a tag was removed is collapsed now
+    assert new(tmp_path, lrc) == legacy(tmp_path, lrc).replace("Next  line", "Next line")
+    tl = subtitles.parse(lrc)
+    assert tl.words(0) == [(1.0, 1.5, "Hello "), (1.5, 2.5, "big "), (2.5, 3.0, "world")]
+
+@pytest.mark.parametrize("tag, shift", [("[offset:+500]", -0.5), ("[offset:-1250]", 1.25), ("[offset: 0]", 0.0), ("[offset:soon]", 0.0)])
+def test_offset_matches_legacy_on_shifted_lrc(tmp_path, tag, shift):
+    body = "[00:02.00]One\n[00:04.00]Two\n[00:06.00]\n"
+    # A positive offset shows the lyrics sooner; the old parser ignored the tag
+    assert new(tmp_path, f"{tag}\n{body}") == legacy(tmp_path, subtitles.shift_lrc(body, shift))
+
+def test_offset_clamps_at_zero():
+    tl = subtitles.parse("[offset:+3000]\n[00:01.00]Early\n[00:05.00]Later\n")
+    assert list(tl.lines()) == [(0.0, 2.0, "Early"), (2.0, 7.0, "Later")]
+
+def test_out_of_order_lines_are_sorted():
+    tl = subtitles.parse("[00:05.00]Second\n[00:01.00]First\n")
+    assert [text for _, _, text in tl.lines()] == ["First", "Second"]
+    assert tl.line(0)[1] == 5.0
+
+def test_shift_lrc_moves_line_and_word_tags():
+    assert subtitles.shift_lrc("[00:59.50]<00:59.50>a <01:00.25>b", 1.0) == "[01:00.50]<01:00.50>a <01:01.25>b"
+    assert subtitles.shift_lrc("[00:00.40]x", -1.0) == "[00:00.00]x"
+
+def test_load_memoizes_identical_contents(tmp_path):
+    subtitles._memo.clear()
+    (tmp_path / "a.lrc").write_text("[00:01.00]Same\n", encoding="utf-8")
+    (tmp_path / "b.lrc").write_text("[00:01.00]Same\n", encoding="utf-8")
+    assert subtitles.load(str(tmp_path / "a.lrc")) is subtitles.load(str(tmp_path / "b.lrc"))
+
+def test_writer_follows_extension(tmp_path):
+    (tmp_path / "in.lrc").write_text("[00:01.00]Fish & <chips>\n", encoding="utf-8")
+    vtt = open(subtitles.convert(str(tmp_path / "in.lrc"), str(tmp_path / "out.vtt")), encoding="utf-8").read()
+    assert vtt == "WEBVTT\n\n00:00:01.000 --> 00:00:06.000\nFish &amp; &lt;chips&gt;\n\n"
+
+# --- ASS KARAOKE ---
+def events(ass):
+    assert ass.startswith(subtitles.ASS_HEADER)
+    return ass[len(subtitles.ASS_HEADER):].splitlines()
+
+def kf_total(body):
+    return sum(int(n) for n in re.findall(r'\\kf?(\d+)', body))
+
+def test_to_ass_sweeps_timed_words():
+    tl = subtitles.parse("[00:01.00]<00:01.00>Hello <00:01.50>big <00:02.50>world<00:03.00>\n[00:04.00]Plain line\n[00:06.00]\n")
+    assert events(subtitles.to_ass(tl)) == [
+        r"Dialogue: 0,0:00:01.00,0:00:04.00,Default,,0,0,0,,{\kf50}Hello {\kf100}big {\kf50}world",
+        "Dialogue: 0,0:00:04.00,0:00:06.00,Default,,0,0,0,,Plain line",
+    ]
+
+def test_to_ass_without_karaoke_shows_plain_lines():
+    tl = subtitles.parse("[00:01.00]<00:01.00>Hello <00:01.50>world\n")
+    assert events(subtitles.to_ass(tl, karaoke=False)) == ["Dialogue: 0,0:00:01.00,0:00:06.00,Default,,0,0,0,,Hello world"]
+
+def test_to_ass_waits_for_late_first_word():
+    tl = subtitles.parse("[00:06.00]<00:06.20>Late <00:06.333>start\n[00:08.00]\n")
+    body = events(subtitles.to_ass(tl))[0].split(",,")[-1]
+    assert body == r"{\k20}{\kf13}Late {\kf167}start"
+
+def test_to_ass_rounding_never_drifts_past_the_line():
+    # 30 words a third of a second apart: rounding each duration alone would drift by 10 cs
+    words = "".join(f"<00:{10 + k / 3:05.2f}>w{k} " for k in range(30))
+    tl = subtitles.parse(f"[00:10.00]{words}\n[00:20.00]\n")
+    body = events(subtitles.to_ass(tl))[0]
+    assert kf_total(body) == 1000
+
+def test_to_ass_text_before_first_word_tag_starts_with_the_line():
+    tl = subtitles.parse("[00:01.00]Oh <00:01.40>yeah\n[00:02.00]\n")
+    assert events(subtitles.to_ass(tl))[0].endswith(r"{\kf40}Oh {\kf60}yeah")
+
+def test_to_ass_repeated_line_reuses_word_timings():
+    tl = subtitles.parse("[00:01.00][00:11.00]<00:01.00>La <00:01.50>la\n[00:03.00][00:13.00]\n")
+    first, second = events(subtitles.to_ass(tl))
+    assert first.split(",,")[-1] == second.split(",,")[-1] == r"{\kf50}La {\kf150}la"
+    assert second.startswith("Dialogue: 0,0:00:11.00,0:00:13.00,")
+
+def test_to_ass_escapes_override_characters():
+    tl = subtitles.parse("[00:01.00]{braces} and back\\slash\n")
+    assert events(subtitles.to_ass(tl))[0].endswith(",,(braces) and back＼slash")
@@ -1,89 +1,193 @@
 import os
-import subprocess
-import re
 import csv
-from datetime import timedelta, datetime
+import json
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from google.colab import drive
+import catalog
+import subtitles
+import telemetry
+from media import DEFAULT_STREAM, STREAM_FORMATS, probe_duration, render_lyric_track, mux_audio, stream_path, stream_video
+from workspace import create_workspace, cleanup_workspace, deliver, flush
 
 # --- CONFIGURATION ---
 ROOT_DIR = "/content/drive/MyDrive/KaraokeOutput"
 VIDEO_OUTPUT_DIR = os.path.join(ROOT_DIR, "Karaoke_Videos_Final")
 session_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 LOG_FILE = f"{ROOT_DIR}/Report_Video_{session_time}.csv"
+telemetry.configure(f"{ROOT_DIR}/Report_Spans.jsonl")
+catalog.configure(ROOT_DIR)
 
 # SET THIS TO TRUE to generate the "Full Vocal" video alongside the Karaoke one
 GENERATE_FULL_VOCAL_VIDEO = True 
+# SET THIS TO TRUE to put the Original audio as a second track inside the Karaoke MP4 instead of a separate file
+COMBINED_AUDIO_TRACKS = False
+# Render preset from media.VIDEO_PRESETS ("static_1080p", "static_720p", or "tv_24fps" for the classic render)
+VIDEO_PRESET = "static_1080p"
+# ".ass" highlights each word as it is sung (enhanced LRC; rendered at >= 24 fps on any preset); ".srt" shows plain lines
+SUBTITLE_EXT = ".ass"
+# "fmp4" or "hls" writes each Karaoke video in place as it renders, so the TV can start on it early
+VIDEO_STREAM = DEFAULT_STREAM
+# Parallel songs when run without --jobs; each ffmpeg gets cores / jobs threads
+DEFAULT_JOBS = max(1, (os.cpu_count() or 2) // 2)
+MANIFEST_FILE = os.path.join(VIDEO_OUTPUT_DIR, ".video_manifest.json")
+MANIFEST_LOCK = threading.Lock()
+LOG_LOCK = threading.Lock()
 
 def log_to_excel(video_name, status, details=""):
-    file_exists = os.path.isfile(LOG_FILE)
-    with open(LOG_FILE, mode='a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["Timestamp", "Video File", "Status", "Details"])
-        writer.writerow([datetime.now().strftime("%H:%M:%S"), video_name, status, details])
+    with LOG_LOCK:
+        file_exists = os.path.isfile(LOG_FILE)
+        with open(LOG_FILE, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(["Timestamp", "Video File", "Status", "Details"])
+            writer.writerow([datetime.now().strftime("%H:%M:%S"), video_name, status, details])
 
 def setup_drive():
     if not os.path.exists('/content/drive'):
         drive.mount('/content/drive')
 
-def lrc_to_srt(lrc_path, srt_path):
-    with open(lrc_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+# --- RESUMABLE BATCH ENGINE ---
+# The manifest maps every finished video to a fingerprint of what it was built from
+# (LRC contents, audio size/mtime, render preset). A rerun skips outputs whose inputs
+# did not change and rebuilds the ones whose lyrics or audio were replaced. Sizes and mtimes
+# come from the library catalog, and the catalog row of each video stamps the exact inputs it
+# was built from, so an unchanged song is settled without touching the Drive mount at all.
+def input_fingerprint(lrc_path, audio_paths, library):
+    h = hashlib.sha1(f"{VIDEO_PRESET}{SUBTITLE_EXT}{VIDEO_STREAM or ''}".encode("utf-8"))
+    with open(lrc_path, 'rb') as f: h.update(f.read())
+    for path in audio_paths:
+        st = library[catalog.relative(path)]
+        h.update(f"|{os.path.basename(path)}:{st['size']}:{st['mtime_ns']}".encode("utf-8"))
+    return h.hexdigest()
 
-    srt_lines = []
-    counter = 1
-    pattern = re.compile(r'\[(\d+):(\d+\.?\d*)\](.*)')
-    
-    parsed_lines = []
-    for line in lines:
-        match = pattern.match(line)
-        if match:
-            minutes = int(match.group(1))
-            seconds = float(match.group(2))
-            raw_text = match.group(3).strip()
-            # Clean <timestamps> from Enhanced LRC
-            clean_text = re.sub(r'<[^>]+>', '', raw_text).strip()
-            start_time = timedelta(minutes=minutes, seconds=seconds)
-            parsed_lines.append((start_time, clean_text))
-
-    for i in range(len(parsed_lines)):
-        start = parsed_lines[i][0]
-        text = parsed_lines[i][1]
-        if i < len(parsed_lines) - 1:
-            end = parsed_lines[i+1][0]
-        else:
-            end = start + timedelta(seconds=5)
-
-        def fmt_time(td):
-            total_sec = int(td.total_seconds())
-            ms = int(td.microseconds / 1000)
-            h = total_sec // 3600
-            m = (total_sec % 3600) // 60
-            s = total_sec % 60
-            return f"{h:02}:{m:02}:{s:02},{ms:03}"
-
-        if text:
-            srt_lines.append(f"{counter}\n{fmt_time(start)} --> {fmt_time(end)}\n{text}\n\n")
-            counter += 1
-
-    with open(srt_path, 'w', encoding='utf-8') as f:
-        f.writelines(srt_lines)
-
-def create_video(audio_path, srt_path, output_path):
-    # TV Style: Yellow Text, Noto Sans Font
-    style = "Fontname=Noto Sans,Fontsize=60,PrimaryColour=&H00FFFF,Outline=3,MarginV=50,Alignment=2"
-
-    cmd = [
-        "ffmpeg", "-y", "-v", "quiet", "-stats",
-        "-f", "lavfi", "-i", "color=c=black:s=1920x1080:r=24",
-        "-i", audio_path,
-        "-vf", f"subtitles={srt_path}:force_style='{style}'",
-        "-shortest", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", "ultrafast",
-        output_path
-    ]
-    subprocess.run(cmd)
+def input_stamp(paths, library):
+    rows = [library[catalog.relative(p)] for p in paths]
+    return f"{VIDEO_PRESET}{SUBTITLE_EXT}{VIDEO_STREAM or ''}|" + "|".join(f"{r['path']}:{r['size']}:{r['mtime_ns']}" for r in rows)
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE): return {}
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def record_output(manifest, video_path, fingerprint):
+    with MANIFEST_LOCK:
+        manifest[os.path.basename(video_path)] = fingerprint
+        tmp = f"{MANIFEST_FILE}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, MANIFEST_FILE)
+
+def is_current(manifest, video_path, library, stamp, fingerprint):
+    """fingerprint() is only called (reading the LRC) when the catalog cannot vouch for the video."""
+    row = library.get(catalog.relative(video_path))
+    if not row: return False
+    if row['inputs'] == stamp: return True
+    name = os.path.basename(video_path)
+    if name not in manifest: record_output(manifest, video_path, fingerprint())  # adopt videos made before the manifest existed
+    elif manifest[name] != fingerprint(): return False
+    catalog.set_inputs(video_path, stamp)
+    return True
+
+def process_song(audio, library, manifest, threads):
+    # Catalog row of the instrumental ("Song_Pitched_+4.mp3" -> song "Song", tag "_+4")
+    audio_file, base_title, key_tag = audio['path'], audio['song'], audio['tag']
+    lrc_file = f"{base_title}.lrc"
+    original_audio = f"{base_title}_Original.mp3"
+
+    # Paths
+    path_inst = os.path.join(ROOT_DIR, audio_file)
+    path_orig = os.path.join(ROOT_DIR, original_audio)
+    path_lrc = os.path.join(ROOT_DIR, lrc_file)
+
+    # Output Paths
+    video_karaoke = stream_path(os.path.join(VIDEO_OUTPUT_DIR, f"{base_title}_Karaoke{key_tag}.mp4"), VIDEO_STREAM)
+    video_full = os.path.join(VIDEO_OUTPUT_DIR, f"{base_title}_FullVocals.mp4")
+
+    # A stamp is only as good as the stats behind it: restat the inputs of songs that already have a video
+    # (an LRC or MP3 edited in place is invisible to the incremental scan)
+    if any(catalog.relative(v) in library for v in (video_karaoke, video_full)):
+        inputs = [path_lrc, path_inst, path_orig]
+        current = catalog.refresh(inputs)
+        for rel in map(catalog.relative, inputs):
+            if rel in current: library[rel] = current[rel]
+            else: library.pop(rel, None)
+    if lrc_file not in library: return 0
+    has_orig = original_audio in library
+    combined = COMBINED_AUDIO_TRACKS and has_orig
+    karaoke_inputs = [path_inst, path_orig] if combined else [path_inst]
+    stamp_karaoke, stamp_full = input_stamp([path_lrc] + karaoke_inputs, library), input_stamp([path_lrc, path_orig], library) if has_orig else None
+    fp_karaoke = lambda: input_fingerprint(path_lrc, karaoke_inputs, library)
+    fp_full = lambda: input_fingerprint(path_lrc, [path_orig], library)
+    need_karaoke = not is_current(manifest, video_karaoke, library, stamp_karaoke, fp_karaoke)
+    need_full = GENERATE_FULL_VOCAL_VIDEO and has_orig and not combined and not key_tag and not is_current(manifest, video_full, library, stamp_full, fp_full)
+    if not (need_karaoke or need_full): return 0
+
+    count = 0
+    print(f"🎬 Processing: {base_title}")
+    # Private scratch dir: the SRT and in-progress MP4s never collide with other jobs
+    work_dir = create_workspace(prefix="karaoke_video_")
+    temp_subs = os.path.join(work_dir, f"subs{SUBTITLE_EXT}")
+    try:
+        with telemetry.span("batch_video", track=base_title):
+            subtitles.convert(path_lrc, temp_subs)
+
+            # The lyric picture is identical for every audio variant: encode it once, then stream-copy it
+            variants = []
+            if need_karaoke: variants.append((karaoke_inputs, video_karaoke, (stamp_karaoke, fp_karaoke), "Karaoke (Inst + Full Vocal tracks)" if combined else "Karaoke (Inst)"))
+            if need_full: variants.append(([path_orig], video_full, (stamp_full, fp_full), "Full Vocal Video"))
+            lyric_track = os.path.join(work_dir, "lyrics_video.mp4")
+            duration = max(probe_duration(a) for inputs, _, _, _ in variants for a in inputs)
+
+            def finished(inputs, video_path, fingerprint, label):
+                stamp, fp = fingerprint
+                record_output(manifest, video_path, fp())
+                catalog.set_inputs(video_path, stamp)
+                print(f"   ✅ Created {label}: {base_title}")
+                log_to_excel(os.path.basename(video_path), "Success", "Multi-track audio" if len(inputs) > 1 else "")
+
+            if VIDEO_STREAM and need_karaoke:
+                # Encoded straight into the output folder with its audio; the full-vocal video copies its picture
+                inputs, video_path, fingerprint, label = variants.pop(0)
+                stream_video(temp_subs, inputs, video_path, VIDEO_STREAM, preset=VIDEO_PRESET, threads=threads,
+                             titles=["Karaoke", "Full Vocals"] if len(inputs) > 1 else None, duration=duration)
+                finished(inputs, video_path, fingerprint, label)
+                count += 1
+                lyric_track = video_path
+            else:
+                render_lyric_track(temp_subs, duration, lyric_track, preset=VIDEO_PRESET, threads=threads)
+
+            for inputs, video_path, fingerprint, label in variants:
+                work_video = os.path.join(work_dir, os.path.basename(video_path))
+                # Multi-track MP4 (combined mode): track 1 = Instrumental, track 2 = Original
+                mux_audio(lyric_track, inputs, work_video, titles=["Karaoke", "Full Vocals"] if len(inputs) > 1 else None, threads=threads)
+                # Recorded in the manifest only once the upload has landed
+                deliver(work_video, video_path, then=lambda args=(inputs, video_path, fingerprint, label): finished(*args))
+                count += 1
+
+    except Exception as e:
+        print(f"   ⚠️ Error ({base_title}): {e}")
+        log_to_excel(base_title, "Failed", str(e))
+
+    cleanup_workspace(work_dir)
+    return count
 
 def main():
+    global VIDEO_STREAM
+    parser = argparse.ArgumentParser(description="Batch-render karaoke videos for every track in the output folder.")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="songs rendered in parallel")
+    parser.add_argument("--threads", type=int, default=0, help="ffmpeg threads per job (default: cores / jobs)")
+    parser.add_argument("--stream", choices=STREAM_FORMATS, default=VIDEO_STREAM, help="write Karaoke videos progressively (fragmented MP4 or HLS)")
+    parser.add_argument("--rescan", action="store_true", help="restat every file in the library instead of trusting the catalog")
+    args = parser.parse_args()
+    VIDEO_STREAM = args.stream
+    jobs = max(1, args.jobs)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // jobs)
+
     setup_drive()
     if not os.path.exists(ROOT_DIR):
         print(f"❌ Error: {ROOT_DIR} not found.")
@@ -93,54 +197,20 @@ def main():
         
     print(f"📄 Video Log: {os.path.basename(LOG_FILE)}")
     
-    files = os.listdir(ROOT_DIR)
-    # Find all instrumental tracks as the base for processing
-    audio_files = [f for f in files if (f.endswith('_Inst.mp3') or f.endswith('_Pitched.mp3'))]
+    changed, removed = catalog.scan(ROOT_DIR, full=args.rescan)
+    print(f"🗂️ Catalog: {changed} new/changed, {removed} removed")
+    library = catalog.artifacts()
+    # Instrumental tracks in the top folder are the base for processing
+    # One instrumental per video name, or two jobs would render (and invalidate) the same output in turn
+    audio_files = [row for row in catalog.instrumentals(library.values()) if not row['folder']]
     
-    print(f"📂 Found {len(audio_files)} tracks to process...")
+    print(f"📂 Found {len(audio_files)} tracks to process ({jobs} jobs x {threads} ffmpeg threads)...")
     
-    count = 0
-    for audio_file in audio_files:
-        # Identify filenames
-        base_title = audio_file.replace("_Inst.mp3", "").replace("_Pitched.mp3", "")
-        lrc_file = f"{base_title}.lrc"
-        original_audio = f"{base_title}_Original.mp3"
-        
-        # Paths
-        path_inst = os.path.join(ROOT_DIR, audio_file)
-        path_orig = os.path.join(ROOT_DIR, original_audio)
-        path_lrc = os.path.join(ROOT_DIR, lrc_file)
-        temp_srt = "temp_subs.srt"
-        
-        # Output Paths
-        video_karaoke = os.path.join(VIDEO_OUTPUT_DIR, f"{base_title}_Karaoke.mp4")
-        video_full = os.path.join(VIDEO_OUTPUT_DIR, f"{base_title}_FullVocals.mp4")
-
-        if os.path.exists(path_lrc):
-            print(f"🎬 Processing: {base_title}")
-            try:
-                lrc_to_srt(path_lrc, temp_srt)
-                
-                # 1. Create KARAOKE Video (Instrumental)
-                if not os.path.exists(video_karaoke):
-                    create_video(path_inst, temp_srt, video_karaoke)
-                    print(f"   ✅ Created Karaoke (Inst)")
-                    log_to_excel(os.path.basename(video_karaoke), "Success")
-                    count += 1
-                
-                # 2. Create FULL VOCAL Video (Original)
-                if GENERATE_FULL_VOCAL_VIDEO and os.path.exists(path_orig):
-                    if not os.path.exists(video_full):
-                        create_video(path_orig, temp_srt, video_full)
-                        print(f"   ✅ Created Full Vocal Video")
-                        log_to_excel(os.path.basename(video_full), "Success")
-                        count += 1
-                        
-            except Exception as e:
-                print(f"   ⚠️ Error: {e}")
-                log_to_excel(base_title, "Failed", str(e))
-                
-            if os.path.exists(temp_srt): os.remove(temp_srt)
+    manifest = load_manifest()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        count = sum(pool.map(lambda f: process_song(f, library, manifest, threads), audio_files))
+    failed = flush()
+    if failed: print(f"⚠️ {len(failed)} video(s) could not be copied to {VIDEO_OUTPUT_DIR}; see the upload errors above")
             
     print(f"\n🎉 Finished! Created {count} new videos.")
 
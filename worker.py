@@ -0,0 +1,152 @@
+import argparse
+import csv
+import fcntl
+import os
+import threading
+import time
+from datetime import datetime
+import catalog
+import downloads
+import jobqueue
+import models
+import stages
+import telemetry
+from media import DEFAULT_STREAM
+from pipeline import run_pipeline
+from workspace import cleanup_workspace, flush
+
+# --- CONFIGURATION ---
+DRIVE_PATH = "/content/drive/MyDrive/KaraokeOutput"
+OUTPUT_DIR = DRIVE_PATH if os.path.exists("/content/drive") else "./output"
+VIDEO_DIR = os.path.join(OUTPUT_DIR, "Karaoke_Videos_Final")
+session_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+LOG_FILE = f"{OUTPUT_DIR}/Report_Dashboard_{session_time}.csv"
+POLL_INTERVAL = 2
+HEARTBEAT_INTERVAL = 10
+WORKER_LOCK = jobqueue.QUEUE_DB + ".worker.lock"
+CHECKPOINT_DIR = os.environ.get("KARAOKE_CHECKPOINTS") or f"{OUTPUT_DIR}/.checkpoints"
+SUBTITLE_EXT = ".ass"  # word-by-word karaoke sweep from enhanced LRC (rendered at >= 24 fps on any preset); ".srt" for plain lines
+VIDEO_STREAM = DEFAULT_STREAM  # "fmp4" or "hls" (KARAOKE_STREAM): videos playable while they render
+telemetry.configure(f"{OUTPUT_DIR}/Report_Spans.jsonl")
+catalog.configure(OUTPUT_DIR)  # published files are recorded for video_maker and later rescans
+
+if not os.path.exists(OUTPUT_DIR): os.makedirs(OUTPUT_DIR)
+if not os.path.exists(VIDEO_DIR): os.makedirs(VIDEO_DIR)
+
+# --- HELPERS ---
+def log_to_excel(title, status, details=""):
+    file_exists = os.path.isfile(LOG_FILE)
+    with open(LOG_FILE, mode='a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if not file_exists: writer.writerow(["Timestamp", "Title", "Status", "Details"])
+        writer.writerow([datetime.now().strftime("%H:%M:%S"), title, status, details])
+
+# --- PIPELINE STAGES ---
+MODEL_FILENAME = "UVR-MDX-NET-Inst_HQ_3.onnx"
+SEPARATOR_PROFILE = models.DEFAULT_PROFILE  # KARAOKE_SEPARATOR_PROFILE: quality, balanced or fast
+DOWNLOAD_WORKERS = downloads.TRACK_WORKERS
+LYRICS_WORKERS = 4
+ENCODE_WORKERS = 2
+QUEUE_SIZE = 2
+STAGES = stages.pipeline_stages(stages.settings(OUTPUT_DIR, VIDEO_DIR, CHECKPOINT_DIR, MODEL_FILENAME, SEPARATOR_PROFILE, SUBTITLE_EXT, VIDEO_STREAM),
+                                DOWNLOAD_WORKERS, LYRICS_WORKERS, ENCODE_WORKERS)
+
+# --- QUEUE JOBS ---
+def list_tracks(url, settings, session):
+    """One job per playlist entry; the flat entry is kept so the download stage does not resolve it again.
+    The listed title only labels the track until the download stage sets (or restores) the real one."""
+    jobs = []
+    for i, track in enumerate(session.list(url)):
+        title, clean_title = stages.track_titles(track.get('title', 'Unknown Track'))
+        jobs.append({'index': i, 'url': downloads.entry_url(track, url), 'entry': track, 'downloads': session, 'title': title, 'clean_title': clean_title,
+                     'keys': settings['keys'], 'generate_video': settings['make_video'], 'video_preset': settings['video_preset']})
+    return jobs
+
+def process_job(qjob):
+    """Runs one queued playlist through the pipeline; tracks finished by an earlier attempt are skipped."""
+    # One download session per job: yt-dlp instances and connections are reused across its tracks
+    with downloads.DownloadSession(DOWNLOAD_WORKERS) as session:
+        job_id = qjob['id']
+        jobqueue.update_progress(job_id, qjob['progress'], "📋 Fetching playlist info...")
+        tracks = list_tracks(qjob['url'], qjob['settings'], session)
+        already_done = jobqueue.finished_tracks(job_id)
+        pending = [t for t in tracks if t['index'] not in already_done]
+        total, finished, failed = len(tracks), len(tracks) - len(pending), 0
+        jobqueue.update_progress(job_id, finished / max(total, 1), f"🎵 {finished}/{total} tracks done")
+
+        def feed():
+            # Cancelling stops new tracks entering the pipeline; tracks already inside finish normally
+            for job in pending:
+                if jobqueue.cancel_requested(job_id): return
+                yield job
+
+        for job in run_pipeline(feed(), STAGES, queue_size=QUEUE_SIZE):
+            if job.get('error'):
+                failed += 1
+                jobqueue.record_track(job_id, job['index'], job['title'], "failed", job['error'])
+                log_to_excel(job['title'], "Failed", job['error'])
+            else:
+                note = "" if job.get('lyrics_found') else "no synced lyrics"
+                if job.get('video_error'): note = f"video error: {job['video_error']}"
+                jobqueue.record_track(job_id, job['index'], job['title'], "done", note)
+                log_to_excel(job['title'], "Success", "Video Created" if job.get('video') else "Audio Only")
+            cleanup_workspace(job.get('workspace'))
+            finished += 1
+            jobqueue.update_progress(job_id, finished / max(total, 1), f"🎵 {finished}/{total} tracks done — last: {job['title']}")
+
+        # Barrier: the job is only finished once every delivered file has reached OUTPUT_DIR
+        jobqueue.update_progress(job_id, finished / max(total, 1), "⏫ Finishing uploads...")
+        lost = flush()
+        summary = f"{total - failed}/{total} tracks processed" + (f", {failed} failed" if failed else "") + (f", {len(lost)} upload(s) failed" if lost else "")
+        if jobqueue.cancel_requested(job_id): jobqueue.finish(job_id, "cancelled", f"Cancelled after {summary}")
+        else: jobqueue.finish(job_id, "done", summary)
+
+# --- DAEMON ---
+def _beat_forever():
+    while True:
+        jobqueue.heartbeat(os.getpid())
+        time.sleep(HEARTBEAT_INTERVAL)
+
+def acquire_worker_lock():
+    """Returns the held lock file, or None when another worker already owns the queue."""
+    os.makedirs(os.path.dirname(WORKER_LOCK) or ".", exist_ok=True)
+    handle = open(WORKER_LOCK, "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+def main():
+    parser = argparse.ArgumentParser(description="Karaoke Cloud queue worker (runs the jobs the dashboard enqueues).")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty instead of waiting for new jobs.")
+    args = parser.parse_args()
+
+    lock = acquire_worker_lock()
+    if lock is None:
+        print("👷 Another worker is already running.")
+        return
+    resumed = jobqueue.recover()
+    if resumed: print(f"♻️ Requeued {resumed} interrupted job(s)")
+    threading.Thread(target=_beat_forever, daemon=True).start()
+    print(f"⚙️ Loading AI Model ({MODEL_FILENAME}, {SEPARATOR_PROFILE} profile)...")
+    models.warm(MODEL_FILENAME, SEPARATOR_PROFILE)
+    print("👷 Worker ready, waiting for jobs...")
+
+    while True:
+        qjob = jobqueue.claim()
+        if qjob is None:
+            if args.once: return
+            time.sleep(POLL_INTERVAL)
+            continue
+        print(f"🚀 Job #{qjob['id']}: {qjob['url']}")
+        try:
+            process_job(qjob)
+        except Exception as e:
+            state = jobqueue.fail(qjob['id'], str(e))
+            log_to_excel("Global Error", "Failed", str(e))
+            print(f"❌ Job #{qjob['id']} {'will retry' if state == 'queued' else 'failed'}: {e}")
+
+if __name__ == "__main__":
+    main()
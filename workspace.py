@@ -0,0 +1,148 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+import catalog
+
+# --- PER-JOB SCRATCH AREAS ---
+# Every job works in its own private directory and only moves finished files into the
+# output folder, so parallel workers (CLI, dashboard sessions, video_maker) never share
+# a scratch file name or expose a half-written artifact.
+SCRATCH_ROOT = os.environ.get("KARAOKE_SCRATCH") or None
+
+def create_workspace(prefix="karaoke_"):
+    if SCRATCH_ROOT and not os.path.exists(SCRATCH_ROOT): os.makedirs(SCRATCH_ROOT, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=SCRATCH_ROOT)
+
+def cleanup_workspace(path):
+    if path and os.path.isdir(path): shutil.rmtree(path, ignore_errors=True)
+
+def publish(src, dest, keep=False):
+    """Atomically places src at dest (rename when possible, copy + rename across filesystems) and catalogs it."""
+    dest_dir = os.path.dirname(dest) or "."
+    os.makedirs(dest_dir, exist_ok=True)
+    if not keep:
+        try:
+            os.replace(src, dest)
+            catalog.record(dest)
+            return dest
+        except OSError:
+            pass
+    part = os.path.join(dest_dir, f".{os.path.basename(dest)}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        shutil.copyfile(src, part)
+        os.replace(part, dest)
+    finally:
+        if os.path.exists(part): os.remove(part)
+    if not keep: os.remove(src)
+    catalog.record(dest)
+    return dest
+
+# --- BACKGROUND WRITE-BACK ---
+# Stages work on local disk; deliver() hands a finished file to a small upload pool and returns
+# at once, so the next track is already processing while this one crawls onto the Drive mount.
+# Each upload is verified (size + SHA-1 of the copy) before it is renamed into place and retried
+# with backoff; a file that still fails stays in the local staging folder and is reported by
+# flush(), the barrier every batch calls before it reports success.
+WRITEBACK_WORKERS = int(os.environ.get("KARAOKE_WRITEBACK_WORKERS", "2"))  # 0 uploads synchronously
+WRITEBACK_MAX_PENDING = 16  # files staged but not yet uploaded; deliver() blocks beyond this
+WRITEBACK_RETRIES = 3
+WRITEBACK_RETRY_SECONDS = 2
+_writeback_lock = threading.Lock()
+_uploader = None
+_staging = None
+_inflight = {}    # dest -> latest future, so a re-delivered file lands after its older copy
+_failed = []
+_slots = threading.BoundedSemaphore(WRITEBACK_MAX_PENDING)
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+    return h.hexdigest()
+
+def _same_filesystem(src, dest_dir):
+    try: return os.stat(src).st_dev == os.stat(dest_dir).st_dev
+    except OSError: return False
+
+def _copy_verified(staged, dest):
+    """Copies staged next to dest, checks the copy against the original and renames it into place."""
+    dest_dir = os.path.dirname(dest) or "."
+    expected = (os.path.getsize(staged), _sha1(staged))
+    for attempt in range(1, WRITEBACK_RETRIES + 1):
+        part = os.path.join(dest_dir, f".{os.path.basename(dest)}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            shutil.copyfile(staged, part)
+            if (os.path.getsize(part), _sha1(part)) != expected: raise OSError("uploaded copy does not match")
+            os.replace(part, dest)
+            return
+        except OSError:
+            if attempt == WRITEBACK_RETRIES: raise
+            time.sleep(WRITEBACK_RETRY_SECONDS * attempt)
+        finally:
+            if os.path.exists(part): os.remove(part)
+
+def _upload(staged, dest, previous, then):
+    try:
+        if previous: wait([previous])
+        _copy_verified(staged, dest)
+        os.remove(staged)
+        catalog.record(dest)
+        if then: then()
+    except Exception as e:
+        kept = staged if os.path.exists(staged) else None
+        with _writeback_lock: _failed.append((dest, str(e), kept))
+        print(f"   ⚠️ Upload failed: {dest} ({e})" + (f"; local copy kept at {kept}" if kept else ""))
+    finally:
+        _slots.release()
+
+def deliver(src, dest, keep=False, then=None):
+    """Like publish, but a copy onto another filesystem happens in the background; then() runs once dest is in place."""
+    dest_dir = os.path.dirname(dest) or "."
+    os.makedirs(dest_dir, exist_ok=True)
+    if WRITEBACK_WORKERS <= 0 or _same_filesystem(src, dest_dir):
+        publish(src, dest, keep=keep)
+        if then: then()
+        return dest
+    global _uploader, _staging
+    _slots.acquire()
+    try:
+        with _writeback_lock:
+            if _uploader is None:
+                _uploader = ThreadPoolExecutor(WRITEBACK_WORKERS, thread_name_prefix="writeback")
+                _staging = create_workspace(prefix="karaoke_writeback_")
+        # The job's workspace is deleted when the track finishes, so the pending file moves out of it
+        staged = os.path.join(_staging, f"{uuid.uuid4().hex[:8]}_{os.path.basename(dest)}")
+        if not keep: shutil.move(src, staged)
+        else:
+            # A hard link stages a kept file instantly (src is never rewritten, only removed with its workspace)
+            try: os.link(src, staged)
+            except OSError: shutil.copyfile(src, staged)
+        with _writeback_lock:
+            _inflight[dest] = _uploader.submit(_upload, staged, dest, _inflight.get(dest), then)
+    except BaseException:
+        _slots.release()
+        raise
+    return dest
+
+def flush():
+    """Waits for every pending upload; returns [(dest, error, local copy)] for those that failed for good."""
+    while True:
+        with _writeback_lock: pending = [f for f in _inflight.values() if not f.done()]
+        if not pending: break
+        wait(pending)
+    with _writeback_lock:
+        _inflight.clear()
+        failed, _failed[:] = list(_failed), []
+    return failed
+
+def separate_in(separator, audio_path, workspace):
+    """Runs the separator with its stems written inside the workspace and returns their full paths."""
+    separator.output_dir = workspace
+    if getattr(separator, 'model_instance', None) is not None: separator.model_instance.output_dir = workspace
+    files = separator.separate(audio_path)
+    return [f if os.path.isabs(f) else os.path.join(workspace, os.path.basename(f)) for f in files]